@@ -0,0 +1,140 @@
+"""A local stand-in for a bank's statement portal, with configurable size and latency"""
+
+import json
+import threading
+import time
+from dataclasses import dataclass
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+SESSION = "session=benchmark"
+
+
+@dataclass
+class PortalOptions:
+    statements: int = 200
+    "Total number of statements"
+    page_size: int = 25
+    "Statements per page of the list"
+    pdf_kb: int = 256
+    "Size of each statement PDF"
+    latency_ms: float = 20
+    "Delay added to every response"
+
+
+class FakePortal:
+    """
+    Serves a login form (`/login`), a paginated statement list (`/statements?page=N`), the
+    same list as JSON (`/api/statements?page=N`) and PDF downloads (`/statements/<id>.pdf`)
+    """
+
+    def __init__(self, options: PortalOptions):
+        self.options = options
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _make_handler(options))
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def __enter__(self) -> "FakePortal":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _statement_page(options: PortalOptions, page: int) -> list[dict]:
+    start = (page - 1) * options.page_size
+    stop = min(start + options.page_size, options.statements)
+    return [
+        {
+            "id": f"stmt-{index:05}",
+            "label": f"Statement #{index}",
+            "url": f"/statements/stmt-{index:05}.pdf",
+        }
+        for index in range(start, stop)
+    ]
+
+
+def _pdf(statement_id: str, size: int) -> bytes:
+    # Unique per statement, so the download manager can't deduplicate them
+    header = f"%PDF-1.4\n% {statement_id}\n".encode()
+    return header + b"0" * max(0, size - len(header))
+
+
+def _make_handler(options: PortalOptions) -> type[BaseHTTPRequestHandler]:
+    pages = max(1, -(-options.statements // options.page_size))
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *_) -> None:
+            pass
+
+        def _logged_in(self) -> bool:
+            cookie: SimpleCookie[str] = SimpleCookie(self.headers.get("Cookie", ""))
+            return "session" in cookie
+
+        def _send(
+            self, body: bytes, content_type: str, headers: dict[str, str] | None = None
+        ) -> None:
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _redirect(self, location: str, headers: dict[str, str] | None = None) -> None:
+            self.send_response(303)
+            self.send_header("Location", location)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+
+        def do_POST(self) -> None:
+            time.sleep(options.latency_ms / 1000)
+            length = int(self.headers.get("Content-Length", 0))
+            self.rfile.read(length)
+            self._redirect("/statements?page=1", {"Set-Cookie": f"{SESSION}; Path=/"})
+
+        def do_GET(self) -> None:
+            time.sleep(options.latency_ms / 1000)
+            url = urlsplit(self.path)
+            page = int(parse_qs(url.query).get("page", ["1"])[0])
+
+            if url.path == "/login":
+                form = (
+                    "<form method=post action=/login>"
+                    "<input name=user><input name=password type=password>"
+                    "<button type=submit>Log in</button></form>"
+                )
+                self._send(form.encode(), "text/html")
+            elif not self._logged_in():
+                self._redirect("/login")
+            elif url.path == "/statements":
+                rows = "".join(
+                    f'<tr class="statement" data-id="{s["id"]}"><td>{s["label"]}</td>'
+                    f'<td><a href="{s["url"]}">Download</a></td></tr>'
+                    for s in _statement_page(options, page)
+                )
+                next_link = f'<a class="next" href="/statements?page={page + 1}">Next</a>'
+                html = f"<table>{rows}</table>{next_link if page < pages else ''}"
+                self._send(html.encode(), "text/html")
+            elif url.path == "/api/statements":
+                data = {"statements": _statement_page(options, page), "pages": pages}
+                self._send(json.dumps(data).encode(), "application/json")
+            elif url.path.startswith("/statements/") and url.path.endswith(".pdf"):
+                statement_id = url.path.rsplit("/", 1)[1].removesuffix(".pdf")
+                self._send(
+                    _pdf(statement_id, options.pdf_kb * 1024),
+                    "application/pdf",
+                    {"Content-Disposition": f'attachment; filename="{statement_id}.pdf"'},
+                )
+            else:
+                self.send_error(404)
+
+    return Handler
@@ -0,0 +1,52 @@
+from dataclasses import dataclass
+from urllib.parse import urlsplit
+
+from playwright.async_api import Page
+
+from src.extract import extract_pages
+
+PROCESS_PAGES = 4
+
+
+@dataclass
+class Entry:
+    # Required
+    id: str
+    label: str
+    # You can add more fields if desired
+    url: str
+
+
+async def _log_in(page: Page) -> None:
+    if "/login" in page.url:
+        await page.fill("input[name=user]", "benchmark")
+        await page.fill("input[name=password]", "benchmark")
+        await page.click("button[type=submit]")
+        await page.wait_for_url("**/statements*")
+
+
+async def find(page: Page):
+    """Yield the statements of every page of the list"""
+    await _log_in(page)
+    fields = {"id": "@data-id", "label": "td", "url": "a@href"}
+    async for records in extract_pages(page, "tr.statement", fields, next="a.next"):
+        for record in records:
+            yield Entry(**record)
+
+
+async def process_one(page: Page, entry: Entry) -> None:
+    if page.url == "about:blank":
+        url = urlsplit(entry.url)
+        await page.goto(f"{url.scheme}://{url.netloc}/statements?page=1")
+    async with page.expect_download() as download:
+        await page.evaluate(
+            """url => {
+                const link = document.createElement("a");
+                link.href = url;
+                document.body.appendChild(link);
+                link.click();
+                link.remove();
+            }""",
+            entry.url,
+        )
+    await download.value
@@ -0,0 +1,155 @@
+"""
+Benchmarks the browser pool, find() and downloads against a local fake statement portal.
+
+    poetry run python -m benchmarks.run [--statements 200] [--pdf-kb 256] ...
+    poetry run python -m benchmarks.run --compare OLD.json NEW.json
+"""
+
+import argparse
+import asyncio
+import json
+import shutil
+import subprocess
+import tempfile
+import time
+from dataclasses import asdict
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+from src.browser import BrowserWrapper
+from src.env import Context, ProcedureInfo, Snapshot
+from src.execution import iter_find, run_process
+from src.procedures import import_procedure
+from src.store import MetadataStore
+
+from .fake_portal import FakePortal, PortalOptions
+
+BENCH_DIR = Path(__file__).parent
+PROCEDURE = "bench_portal"
+
+
+def _use_home(home: Path) -> None:
+    """Point every Context path at a throwaway directory"""
+    Context.home_p = home
+    Context.procedures_dir_p = home / "procedure_scripts"
+    Context.config_p = home / "data.json"
+    Context.store_p = home / "data.sqlite3"
+
+
+def _commit() -> str | None:
+    result = subprocess.run(
+        ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=BENCH_DIR
+    )
+    return result.stdout.strip() or None
+
+
+async def _benchmark(ctx: Context, proc: ProcedureInfo) -> dict[str, float]:
+    metrics = dict[str, float]()
+    module = import_procedure(ctx, proc.name)
+
+    start = time.perf_counter()
+    wrapper = await BrowserWrapper.init(ctx=ctx, proc=proc, initial_url=None, headless=True)
+    metrics["cold_start_s"] = time.perf_counter() - start
+    await wrapper.close()
+
+    start = time.perf_counter()
+    wrapper = await BrowserWrapper.init(ctx=ctx, proc=proc, initial_url=None, headless=True)
+    metrics["warm_start_s"] = time.perf_counter() - start
+
+    try:
+        start = time.perf_counter()
+        await wrapper.page.goto(proc.initial_url)
+        entries = list[Any]()
+        async for entry in iter_find(module, wrapper.page):
+            if not entries:
+                metrics["time_to_first_entry_s"] = time.perf_counter() - start
+            entries.append(entry)
+        elapsed = time.perf_counter() - start
+        metrics["find_s"] = elapsed
+        metrics["entries"] = len(entries)
+        metrics["entries_per_s"] = len(entries) / elapsed
+
+        start = time.perf_counter()
+        results = await run_process(wrapper, module, entries)
+        await wrapper.downloads.wait()
+        elapsed = time.perf_counter() - start
+        downloaded = sum(record.size for record in wrapper.downloads.saved)
+        metrics["process_s"] = elapsed
+        metrics["failed_entries"] = sum(not result.ok for result in results)
+        metrics["downloads"] = len(wrapper.downloads.saved)
+        metrics["download_mb_per_s"] = downloaded / 1e6 / elapsed
+    finally:
+        await wrapper.close()
+        await ctx.close()
+    return metrics
+
+
+def run(options: PortalOptions, output_dir: Path) -> Path:
+    with tempfile.TemporaryDirectory(prefix="state_dl_bench_") as home, FakePortal(
+        options
+    ) as portal:
+        _use_home(Path(home))
+        Context.procedures_dir_p.mkdir(parents=True)
+        shutil.copy(BENCH_DIR / "procedures" / f"{PROCEDURE}.py", Context.procedures_dir_p)
+
+        store = MetadataStore(Context.store_p)
+        proc = ProcedureInfo(
+            name=PROCEDURE, snapshots=[Snapshot(uri=f"{portal.url}/statements?page=1")]
+        )
+        store.save_procedure(proc.name, proc)
+        ctx = Context(store.load(), store)
+        metrics = asyncio.run(_benchmark(ctx, ctx.all_procedures[PROCEDURE]))
+
+    now = datetime.now()
+    commit = _commit()
+    result = {
+        "commit": commit,
+        "time": now.isoformat(),
+        "options": asdict(options),
+        "metrics": metrics,
+    }
+    output_dir.mkdir(parents=True, exist_ok=True)
+    path = output_dir / f"{now:%Y-%m-%d_%H-%M-%S}_{commit or 'unknown'}.json"
+    path.write_text(json.dumps(result, indent=4))
+    return path
+
+
+def compare(old_path: Path, new_path: Path) -> None:
+    old, new = (json.loads(path.read_text()) for path in (old_path, new_path))
+    if old["options"] != new["options"]:
+        print("Warning: the runs used different options")
+    old_name, new_name = old["commit"] or "old", new["commit"] or "new"
+    print(f"{'metric':<24}{old_name:>12}{new_name:>12}{'change':>10}")
+    for name, new_value in new["metrics"].items():
+        old_value = old["metrics"].get(name)
+        if old_value is None:
+            print(f"{name:<24}{'-':>12}{new_value:>12.3f}")
+            continue
+        change = f"{(new_value - old_value) / old_value:+.1%}" if old_value else "-"
+        print(f"{name:<24}{old_value:>12.3f}{new_value:>12.3f}{change:>10}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run")
+    defaults = PortalOptions()
+    parser.add_argument("--statements", type=int, default=defaults.statements)
+    parser.add_argument("--page-size", type=int, default=defaults.page_size)
+    parser.add_argument("--pdf-kb", type=int, default=defaults.pdf_kb)
+    parser.add_argument("--latency-ms", type=float, default=defaults.latency_ms)
+    parser.add_argument("--output", type=Path, default=BENCH_DIR / "results")
+    parser.add_argument("--compare", type=Path, nargs=2, metavar=("OLD", "NEW"))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    options = PortalOptions(args.statements, args.page_size, args.pdf_kb, args.latency_ms)
+    path = run(options, args.output)
+    print(path.read_text())
+    print(f"Saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,9 +6,10 @@ from textual.widget import Widget
 from textual.widgets import Button, Footer, OptionList
 from textual.widgets.option_list import Option
 
-from .env import Config, Context, ProcedureInfo
-from .screens.edit_procedure import EditProcedure
+from . import startup
+from .env import Context, ProcedureInfo
 from .screens.new_procedure import NewProcedure
+from .store import MetadataStore
 from .widgets.confirm_dialog import ConfirmDialog
 
 
@@ -25,10 +26,17 @@ class MyApp(App):
         css_path=None,
         watch_css: bool = False,
     ):
-        self._config = Config.load_from_path(Context.config_p)
-        self.ctx = Context(self._config)
+        self._store = MetadataStore(Context.store_p)
+        self._config = self._store.load(import_from=Context.config_p)
+        self.ctx = Context(self._config, self._store)
         super().__init__(driver_class, css_path, watch_css)
 
+    def on_ready(self) -> None:
+        startup.mark("Main menu shown")
+
+    async def on_unmount(self) -> None:
+        await self.ctx.close()
+
     def compose(self) -> ComposeResult:
         with Widget(classes="button-row"):
             yield Button("New procedure", id="new_procedure")
@@ -55,6 +63,14 @@ class MyApp(App):
         self.push_screen(NewProcedure(self.ctx), self.switch_from_new_to_edit_procedure)
 
     def switch_from_new_to_edit_procedure(self, proc: ProcedureInfo):
+        self._push_edit_procedure(proc)
+
+    def _push_edit_procedure(self, proc: ProcedureInfo) -> None:
+        # Imported here since it loads playwright, which the main menu doesn't need
+        from .screens.edit_procedure import EditProcedure
+
+        self.ctx.prune_snapshots([proc.name])
+        proc = self.ctx.all_procedures.get(proc.name, proc)
         self.push_screen(EditProcedure(self.ctx, proc=proc), self.save_procedure)
 
     @on(OptionList.OptionHighlighted, "#procedure_list")
@@ -85,10 +101,7 @@ class MyApp(App):
     async def edit_procedure(self) -> None:
         proc = self._selected_procedure
         assert proc, "no procedure selected or it is missing"
-        self.app.push_screen(
-            EditProcedure(self.ctx, proc=proc),
-            self.save_procedure,
-        )
+        self._push_edit_procedure(proc)
 
     @on(Button.Pressed, "#delete_procedure")
     def start_delete(self):
@@ -106,7 +119,10 @@ class MyApp(App):
         self.procedure_list.remove_option_at_index(index)  # UI
         self.ctx.all_procedures.pop(proc.name, None)  # Internal runtime
         self._config.procedures.pop(proc.name, None)  # Config
-        self._config.save_to_path(self.ctx.config_p)
+        self._store.delete_procedure(proc.name)
+        self.ctx.find_cache.invalidate(proc.name)
+        self.ctx.entry_index.forget(proc.name)
+        self.ctx.run_history.forget(proc.name)
         # TODO: Move to /tmp, just in case?
         (self.ctx.procedures_dir_p / f"{proc.name}.py").unlink(missing_ok=True)  # Filesystem
 
@@ -122,4 +138,4 @@ class MyApp(App):
             self.procedure_list.add_option(Option(name, id=name))  # UI
         self.ctx.all_procedures[name] = proc  # Internal runtime
         self._config.procedures[name] = proc  # Config
-        self._config.save_to_path(self.ctx.config_p)
+        self._store.save_procedure(name, proc)
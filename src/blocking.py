@@ -0,0 +1,54 @@
+import re
+from collections import Counter
+from typing import TYPE_CHECKING
+from urllib.parse import urlsplit
+
+from playwright.async_api import Request, Response, Route
+
+if TYPE_CHECKING:
+    from .env import ResourcePolicy
+
+
+class ResourceBlocker:
+    """Aborts requests matching a procedure's `ResourcePolicy` and counts what it saw"""
+
+    def __init__(self, policy: "ResourcePolicy"):
+        self.policy = policy
+        self._types = set(policy.block_resource_types)
+        self._domains = tuple(domain.lower().lstrip(".") for domain in policy.block_domains)
+        self._patterns = [re.compile(pattern) for pattern in policy.block_url_patterns]
+
+        self.blocked = Counter[str]()
+        "Blocked requests by resource type"
+        self.allowed_requests = 0
+        self.allowed_bytes = 0
+        "Sum of the `content-length` of allowed responses (chunked responses aren't counted)"
+
+    def should_block(self, request: Request) -> bool:
+        if request.resource_type in self._types:
+            return True
+        if self._domains:
+            host = (urlsplit(request.url).hostname or "").lower()
+            if any(host == domain or host.endswith(f".{domain}") for domain in self._domains):
+                return True
+        return any(pattern.search(request.url) for pattern in self._patterns)
+
+    async def handle(self, route: Route) -> None:
+        if self.should_block(route.request):
+            self.blocked[route.request.resource_type] += 1
+            await route.abort("blockedbyclient")
+        else:
+            await route.fallback()
+
+    def on_response(self, response: Response) -> None:
+        self.allowed_requests += 1
+        length = response.headers.get("content-length")
+        if length and length.isdigit():
+            self.allowed_bytes += int(length)
+
+    def summary(self) -> str:
+        total = sum(self.blocked.values())
+        by_type = ", ".join(f"{type}: {count}" for type, count in self.blocked.most_common())
+        blocked = f"Blocked {total} request(s)" + (f" ({by_type})" if by_type else "")
+        loaded = f"loaded {self.allowed_requests} ({self.allowed_bytes / 1e6:.1f} MB)"
+        return f"{blocked}, {loaded}"
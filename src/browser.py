@@ -1,10 +1,211 @@
-from typing import TYPE_CHECKING, Awaitable, Callable
+import asyncio
+import json
+import os
+import socket
+from collections import Counter
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, AsyncIterator, Awaitable, Callable
 
-from playwright.async_api import BrowserContext, Page, async_playwright
+from playwright.async_api import (
+    Browser,
+    BrowserContext,
+    Page,
+    Playwright,
+    StorageState,
+    async_playwright,
+)
 from typing_extensions import Self
 
+from .blocking import ResourceBlocker
+from .downloads import DownloadManager
+from .memory import browser_rss_mb
+from .ratelimit import RateLimiter
+from .tracing import span
+
 if TYPE_CHECKING:
-    from .env import Context
+    from .env import Context, ProcedureInfo, Snapshot
+
+
+class BrowserPool:
+    """
+    Keeps launched browsers warm so that screens and runs only pay for creating a new
+    (isolated) `BrowserContext`. A browser is shut down once it has had no open contexts
+    for `idle_timeout` seconds.
+
+    With `remote_debugging`, browsers also listen on a local CDP endpoint so other processes
+    can share them. With `cdp_endpoint`, the pool connects to such a browser instead of
+    launching its own.
+    """
+
+    def __init__(
+        self,
+        idle_timeout: float | None = 300,
+        *,
+        remote_debugging: bool = False,
+        cdp_endpoint: str | None = None,
+    ):
+        self.idle_timeout = idle_timeout
+        self.remote_debugging = remote_debugging
+        self.cdp_endpoint = cdp_endpoint
+        self._playwright: Playwright | None = None
+        self._browsers = dict[bool, Browser]()
+        "Launched browsers keyed by whether they are headless"
+        self._endpoints = dict[bool, str]()
+        self._contexts = dict[bool, set[BrowserContext]]()
+        self._holds = Counter[bool]()
+        "Browsers kept alive for other processes, see `shared_endpoint()`"
+        self._idle_handles = dict[bool, asyncio.TimerHandle]()
+        self._lock = asyncio.Lock()
+        self._profile_locks = dict[Path, asyncio.Lock]()
+        self._persistent = set[BrowserContext]()
+
+    async def _ensure_playwright(self) -> Playwright:
+        if self._playwright is None:
+            self._playwright = await async_playwright().start()
+        return self._playwright
+
+    async def browser(self, *, headless: bool) -> Browser:
+        """Return a running browser, launching one if there isn't one already"""
+        async with self._lock:
+            if handle := self._idle_handles.pop(headless, None):
+                handle.cancel()
+
+            browser = self._browsers.get(headless)
+            if browser and browser.is_connected():
+                return browser
+
+            playwright = await self._ensure_playwright()
+            if self.cdp_endpoint:
+                with span("browser.connect"):
+                    browser = await playwright.chromium.connect_over_cdp(self.cdp_endpoint)
+            else:
+                args = []
+                if self.remote_debugging:
+                    port = _free_port()
+                    args.append(f"--remote-debugging-port={port}")
+                    self._endpoints[headless] = f"http://127.0.0.1:{port}"
+                with span("browser.launch", headless=headless):
+                    browser = await playwright.chromium.launch(
+                        headless=headless, timeout=15000, args=args
+                    )
+            self._browsers[headless] = browser
+            self._contexts[headless] = set()
+            return browser
+
+    @asynccontextmanager
+    async def shared_endpoint(self, *, headless: bool) -> AsyncIterator[str]:
+        """Yield the CDP endpoint of a browser, keeping it running until the block exits"""
+        assert self.remote_debugging, "BrowserPool must be created with remote_debugging"
+        await self.browser(headless=headless)
+        self._holds[headless] += 1
+        try:
+            yield self._endpoints[headless]
+        finally:
+            self._holds[headless] -= 1
+            if not self._holds[headless] and not self._contexts.get(headless):
+                self._schedule_idle_close(headless)
+
+    async def warm(self, *, headless: bool = False) -> None:
+        """Launch a browser ahead of time so the first context is cheap"""
+        await self.browser(headless=headless)
+        if not self._contexts[headless]:
+            self._schedule_idle_close(headless)
+
+    async def new_context(self, *, headless: bool = False, **kwargs: Any) -> BrowserContext:
+        """Create an isolated context that is returned to the pool when it closes"""
+        browser = await self.browser(headless=headless)
+        with span("browser.new_context"):
+            context = await browser.new_context(**kwargs)
+        self._contexts[headless].add(context)
+        context.on("close", lambda context: self._release(headless, context))
+        return context
+
+    async def persistent_context(
+        self,
+        user_data_dir: Path,
+        *,
+        browser: str = "chromium",
+        headless: bool = False,
+        **kwargs: Any,
+    ) -> BrowserContext:
+        """
+        Launch a browser with the persistent profile in `user_data_dir`, so cookies,
+        localStorage, IndexedDB and the HTTP cache are kept between runs. A profile can only
+        be used by one context at a time, so this waits for the previous one to close.
+        """
+        lock = self._profile_locks.setdefault(user_data_dir, asyncio.Lock())
+        await lock.acquire()
+        try:
+            async with self._lock:
+                playwright = await self._ensure_playwright()
+            profile = user_data_dir.name
+            with span("browser.launch_persistent", browser=browser, profile=profile):
+                context = await getattr(playwright, browser).launch_persistent_context(
+                    user_data_dir, headless=headless, **kwargs
+                )
+        except BaseException:
+            lock.release()
+            raise
+        self._persistent.add(context)
+
+        def _on_close(context: BrowserContext) -> None:
+            self._persistent.discard(context)
+            lock.release()
+
+        context.on("close", _on_close)
+        return context
+
+    def _release(self, headless: bool, context: BrowserContext) -> None:
+        contexts = self._contexts.get(headless)
+        if contexts is None:
+            return
+        contexts.discard(context)
+        if not contexts and not self._holds[headless]:
+            self._schedule_idle_close(headless)
+
+    def _schedule_idle_close(self, headless: bool) -> None:
+        if self.idle_timeout is None:
+            return
+        if handle := self._idle_handles.pop(headless, None):
+            handle.cancel()
+        self._idle_handles[headless] = asyncio.get_running_loop().call_later(
+            self.idle_timeout,
+            lambda: asyncio.ensure_future(self._close_browser(headless)),
+        )
+
+    async def _close_browser(self, headless: bool) -> None:
+        async with self._lock:
+            self._idle_handles.pop(headless, None)
+            if self._contexts.get(headless) or self._holds[headless]:
+                return  # A context was handed out in the meantime
+            self._contexts.pop(headless, None)
+            self._endpoints.pop(headless, None)
+            if browser := self._browsers.pop(headless, None):
+                await browser.close()
+
+    async def close(self) -> None:
+        """Shut down every browser and the playwright driver"""
+        for handle in self._idle_handles.values():
+            handle.cancel()
+        self._idle_handles.clear()
+        for context in list(self._persistent):
+            await context.close()
+        async with self._lock:
+            for browser in self._browsers.values():
+                await browser.close()
+            self._browsers.clear()
+            self._endpoints.clear()
+            self._contexts.clear()
+            if self._playwright is not None:
+                await self._playwright.stop()
+                self._playwright = None
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
 
 
 class BrowserWrapper:
@@ -14,31 +215,179 @@ class BrowserWrapper:
 
     @classmethod
     async def init(
-        cls, *, ctx: "Context", initial_url: str | None, on_close: Callable | None = None
+        cls,
+        *,
+        ctx: "Context",
+        proc: "ProcedureInfo",
+        initial_url: str | None,
+        on_close: Callable | None = None,
+        headless: bool = False,
+        rate_limiter: RateLimiter | None = None,
     ) -> Self:
+        """`rate_limiter` is shared between wrappers to limit requests across all of them"""
         self = cls(_external=False)
         self._user_on_close = on_close
-        await self._start(ctx, initial_url)
+        await self._start(ctx, proc, initial_url, headless, rate_limiter)
         return self
 
-    async def _start(self, ctx: "Context", url: str | None) -> None:
-        playwright = await async_playwright().start()
-        browser = await playwright.chromium.launch(headless=False, timeout=15000)
+    async def _start(
+        self,
+        ctx: "Context",
+        proc: "ProcedureInfo",
+        url: str | None,
+        headless: bool,
+        rate_limiter: RateLimiter | None,
+    ) -> None:
+        self._pool = ctx.browser_pool
+        self._headless = headless
+        self._snapshot_store = ctx.snapshot_store
+        self._rate_limiter = rate_limiter
+        self.recycle_page_after = ctx.recycle_page_after
+        self.browser_memory_limit_mb = ctx.browser_memory_limit_mb
+        self._profile: tuple[Path, str] | None = None
+        "Directory and browser of the persistent profile, if the procedure uses one"
+        self._auth_path: Path | None = None
+        self._recycled = set[BrowserContext]()
+        "Contexts replaced by `recycle_context()`, whose events are ignored"
+        storage_state = None
+        if proc.context is not None:
+            if proc.context not in ctx.contexts:
+                raise ValueError(f"Procedure {proc.name} uses unknown context {proc.context}")
+            # Persistent profiles save their own state, no need for a storage state file
+            self._profile = (
+                ctx.home_p / "contexts" / proc.context,
+                ctx.contexts[proc.context].browser.value,
+            )
+        else:
+            self._auth_path = ctx.home_p / "browser_context.json"
+            if self._auth_path.exists():
+                storage_state = json.loads(self._auth_path.read_text())
+                self._saved_state = json.dumps(storage_state)
+        self.downloads = DownloadManager(ctx.home_p / "downloads" / proc.name)
+        self.blocker = ResourceBlocker(proc.resource_policy)
+        await self._open_context(storage_state)
+        await self._save_storage_state()
+        if url:
+            await self.goto(url)
 
-        # TODO: Use contexts listed in ctx
-        self._auth_path = ctx.home_p / "browser_context.json"
-        ss = self._auth_path if self._auth_path.exists() else None
-        self.context = await browser.new_context(storage_state=ss)
+    async def _open_context(self, storage_state: StorageState | None) -> None:
+        """Create `self.context` and its main page, with our listeners and routes attached"""
+        if self._profile is not None:
+            user_data_dir, browser = self._profile
+            self.context = await self._pool.persistent_context(
+                user_data_dir, browser=browser, headless=self._headless
+            )
+        else:
+            self.context = await self._pool.new_context(
+                headless=self._headless, storage_state=storage_state
+            )
         self.context.set_default_timeout(0)
-        if not ss:
-            await self.context.storage_state(path=self._auth_path)
 
+        self._page_count = 0
         self.context.on("close", self._on_close)
         self.context.on("page", self._increment_page_count)
+        for page in self.context.pages:
+            # A persistent context starts with a page already open
+            self._increment_page_count(page)
+        self.downloads.attach(self.context)
+        self.context.on("response", self.blocker.on_response)
+        await self._route(self.context)
 
-        self.page = await self.context.new_page()
-        if url:
-            await self.page.goto(url)
+        pages = self.context.pages
+        self.page = pages[0] if pages else await self.context.new_page()
+
+    async def recycle_context(self) -> None:
+        """
+        Replace the context with a new one to free the memory the browser accumulated for
+        it, keeping cookies and localStorage (or the persistent profile). Every page of the
+        old context is closed, including `self.page`, which is replaced by a blank page.
+        """
+        with span("browser.recycle_context"):
+            await self.downloads.wait()
+            old = self.context
+            self._recycled.add(old)
+            storage_state = None
+            if self._profile is None:
+                storage_state = await old.storage_state()
+                await self._save_storage_state(storage_state)
+            else:
+                # The profile can only be opened again once the old context released it
+                await old.close()
+            await self._open_context(storage_state)
+            await old.close()
+
+    def browser_rss_mb(self) -> float | None:
+        """Resident memory of the browser processes, see `memory.browser_rss_mb()`"""
+        # Workers connect to the browser launched by their parent process
+        return browser_rss_mb(os.getppid() if self._pool.cdp_endpoint else None)
+
+    async def goto(self, url: str) -> None:
+        """Navigate the main page to `url`, which may point to the snapshot store"""
+        with span("page.goto", url=url):
+            await self.page.goto(self._snapshot_store.resolve_uri(url))
+
+    async def _route_blocker(self, context: BrowserContext) -> None:
+        if self.blocker.policy:
+            # Routes run most recently registered first, so (re)register the blocker last
+            await context.unroute("**/*", self.blocker.handle)
+            await context.route("**/*", self.blocker.handle)
+
+    _har: Path | None = None
+    "Recorded traffic that is replayed instead of using the network"
+
+    async def _route(self, context: BrowserContext) -> None:
+        if self._rate_limiter is not None:
+            # Registered first so blocked (or replayed) requests don't use up the rate
+            await context.route("**/*", self._rate_limiter.handle)
+        if self._har is not None:
+            # Requests that weren't recorded are aborted, so a replay never uses the network
+            await context.route_from_har(self._har, not_found="abort")
+        await self._route_blocker(context)
+
+    async def goto_snapshot(self, snap: "Snapshot") -> None:
+        """Navigate to a snapshot, replaying its recorded traffic if it has any"""
+        snap = self._snapshot_store.resolve(snap)
+        if self._har is not None or snap.har is not None:
+            # There is no handler to unroute the previous HAR with, so start over
+            await self.context.unroute("**/*")
+            self._har = snap.har
+            await self._route(self.context)
+        with span("page.goto", url=snap.uri, replay=snap.har is not None):
+            await self.page.goto(snap.uri)
+
+    async def record_har(self, url: str, path: Path) -> None:
+        """
+        Load `url` in a separate context (sharing our cookies, etc.) that records all of the
+        network traffic into `path`
+        """
+        context = await self._pool.new_context(
+            headless=self._headless,
+            storage_state=await self.context.storage_state(),
+            record_har_path=path,
+            record_har_content="embed",
+        )
+        await self._route_blocker(context)
+        try:
+            page = await context.new_page()
+            await page.goto(url, wait_until="networkidle")
+        finally:
+            await context.close()  # The HAR file is only written on close
+
+    _saved_state: str | None = None
+
+    async def _save_storage_state(self, state: StorageState | None = None) -> None:
+        """Write the cookies and localStorage of the context to disk if they changed"""
+        if self._auth_path is None:
+            return
+        if state is None:
+            state = await self.context.storage_state()
+        serialized = json.dumps(state)
+        if serialized == self._saved_state:
+            return
+        tmp = self._auth_path.with_suffix(".tmp")
+        tmp.write_text(serialized)
+        os.replace(tmp, self._auth_path)
+        self._saved_state = serialized
 
     _page_count = 0
 
@@ -46,15 +395,31 @@ class BrowserWrapper:
         self._page_count += 1
         page.on("close", self._decrement_page_count)
 
-    async def _decrement_page_count(self, _page: Page):
+    async def _decrement_page_count(self, page: Page):
+        if page.context in self._recycled or self._closed:
+            return
         self._page_count -= 1
         if self._page_count <= 0:
-            await self.context.storage_state(path=self._auth_path)
+            await self.downloads.wait()
+            await self._save_storage_state()
             await self.context.close()
 
+    _closed = False
+    "Set by `close()`, as closing the context closes its pages after it is gone"
+
+    async def close(self) -> None:
+        """Save the storage state and hand the browser back to the pool"""
+        await self.downloads.wait()
+        if self._page_count > 0:
+            await self._save_storage_state()
+        self._closed = True
+        await self.context.close()
+
     _user_on_close: Callable[[], None | Awaitable[None]] | None
 
-    async def _on_close(self, _browser: BrowserContext):
+    async def _on_close(self, context: BrowserContext):
+        if context in self._recycled:
+            return
         if self._user_on_close:
             result = self._user_on_close()
             if isinstance(result, Awaitable):
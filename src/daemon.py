@@ -0,0 +1,187 @@
+import asyncio
+import random
+import signal
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+
+from rich.console import Console
+
+from .env import Context, ProcedureInfo
+from .ratelimit import RateLimiter
+from .runner import RunResult, run_procedure
+from .store import MetadataStore
+
+TICK = 30
+"Seconds between checks for procedures that are due"
+RETRY_BASE = 60
+"Seconds before the first retry of a failed run. Doubles with every retry."
+
+
+class Daemon:
+    """
+    Runs procedures on their `schedule`, keeping one browser running between runs. Schedules
+    are re-read from the metadata store every `TICK`, so they can be changed while it runs.
+    """
+
+    def __init__(
+        self,
+        ctx: Context,
+        *,
+        concurrency: int,
+        domain_concurrency: int,
+        requests_per_second: float | None,
+        headless: bool = True,
+    ):
+        self.ctx = ctx
+        self.headless = headless
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._domain_limit = domain_concurrency
+        self._domains = dict[str, asyncio.Semaphore]()
+        self.rate_limiter = None
+        if requests_per_second:
+            self.rate_limiter = RateLimiter(requests_per_second)
+
+        self._due = dict[str, datetime]()
+        "When each scheduled procedure runs next (including jitter and backoff)"
+        self._attempts = dict[str, int]()
+        "Failed attempts of the current run of each procedure"
+        self._running = dict[str, asyncio.Task[None]]()
+        self._console = Console(highlight=False)
+
+    def _log(self, message: str) -> None:
+        self._console.print(f"[dim]{datetime.now():%Y-%m-%d %H:%M:%S}[/] {message}")
+
+    def _scheduled(self) -> dict[str, ProcedureInfo]:
+        config = self.ctx.store.load()
+        return {
+            name: ProcedureInfo.from_proc(proc, name=name)
+            for name, proc in config.procedures.items()
+            if proc.schedule is not None
+        }
+
+    def _next_run(self, proc: ProcedureInfo) -> datetime:
+        assert proc.schedule is not None
+        jitter = timedelta(minutes=random.uniform(0, proc.schedule.jitter_minutes))
+        last = self.ctx.run_history.last_run(proc.name)
+        if last is None:
+            return datetime.now() + jitter
+        return last + timedelta(minutes=proc.schedule.interval_minutes) + jitter
+
+    def _domain(self, proc: ProcedureInfo) -> asyncio.Semaphore:
+        domain = (urlsplit(proc.initial_url).hostname or "").lower().removeprefix("www.")
+        if domain not in self._domains:
+            self._domains[domain] = asyncio.Semaphore(self._domain_limit)
+        return self._domains[domain]
+
+    async def run(self) -> None:
+        """Run until cancelled"""
+        self.ctx.prune_snapshots()
+        self.ctx.browser_pool.idle_timeout = None
+        await self.ctx.browser_pool.warm(headless=self.headless)
+        self._log("Daemon started")
+        if self.rate_limiter and self.ctx.isolated_execution:
+            # Workers have their own connection to the browser, whose requests the limiter
+            # can't route
+            self._log(
+                "[yellow]Warning:[/] with isolated_execution, daemon_requests_per_second only"
+                " limits loading landing pages for their fingerprint"
+            )
+        try:
+            while True:
+                self._start_due()
+                await asyncio.sleep(TICK)
+        finally:
+            for task in self._running.values():
+                task.cancel()
+            await asyncio.gather(*self._running.values(), return_exceptions=True)
+            await self.ctx.close()
+
+    def _start_due(self) -> None:
+        scheduled = self._scheduled()
+        for name in self._due.keys() - scheduled.keys():
+            # The schedule was removed
+            del self._due[name]
+        now = datetime.now()
+        for name, proc in scheduled.items():
+            if name in self._running:
+                continue
+            if name not in self._due:
+                self._due[name] = self._next_run(proc)
+                self._log(f"{name}: next run at {self._due[name]:%Y-%m-%d %H:%M:%S}")
+            if self._due[name] <= now:
+                self._running[name] = asyncio.create_task(self._run(proc))
+
+    async def _run(self, proc: ProcedureInfo) -> None:
+        assert proc.schedule is not None
+        try:
+            # Waiting for the site's turn without holding one of the global slots, which would
+            # keep other sites waiting too
+            async with self._domain(proc), self._semaphore:
+                started = datetime.now()
+                self._log(f"{proc.name}: running")
+                result = await run_procedure(
+                    self.ctx,
+                    proc,
+                    headless=self.headless,
+                    timeout=(
+                        None
+                        if proc.schedule.timeout_minutes is None
+                        else proc.schedule.timeout_minutes * 60
+                    ),
+                    rate_limiter=self.rate_limiter,
+                )
+            self._log(f"{proc.name}: {_describe(result)}")
+
+            attempts = self._attempts.get(proc.name, 0)
+            if not result.ok and attempts < proc.schedule.retries:
+                self._attempts[proc.name] = attempts + 1
+                # Don't wait longer than the next regular run would
+                delay = min(RETRY_BASE * 2**attempts, proc.schedule.interval_minutes * 60)
+                self._due[proc.name] = datetime.now() + timedelta(seconds=delay)
+                self._log(f"{proc.name}: retry {attempts + 1} in {delay:.0f}s")
+                return
+
+            self._attempts.pop(proc.name, None)
+            self.ctx.run_history.record_run(proc.name, started, result.error)
+            self._due[proc.name] = self._next_run(proc)
+            self._log(f"{proc.name}: next run at {self._due[proc.name]:%Y-%m-%d %H:%M:%S}")
+        finally:
+            del self._running[proc.name]
+
+
+def _describe(result: RunResult) -> str:
+    if result.error:
+        return f"[red]failed[/] ({result.error}) after {result.elapsed:.1f}s"
+    if result.skipped:
+        return f"unchanged, skipped after {result.elapsed:.1f}s"
+    status = f"[red]{result.failed} entries failed[/]" if result.failed else "[green]ok[/]"
+    return (
+        f"{status}, processed {result.processed}/{result.entries} entries, "
+        f"{result.downloads} downloads in {result.elapsed:.1f}s"
+    )
+
+
+def run(*, headless: bool = True) -> None:
+    """Run the daemon until interrupted (SIGINT or SIGTERM)"""
+    store = MetadataStore(Context.store_p)
+    config = store.load(import_from=Context.config_p)
+    ctx = Context(config, store)
+
+    async def _main() -> None:
+        daemon = Daemon(
+            ctx,
+            concurrency=config.daemon_concurrency,
+            domain_concurrency=config.daemon_domain_concurrency,
+            requests_per_second=config.daemon_requests_per_second,
+            headless=headless,
+        )
+        task = asyncio.create_task(daemon.run())
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, task.cancel)
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(_main())
@@ -12,7 +12,24 @@ class Entry:
 
 
 async def find(page: Page) -> list[Entry]:
-    """Return a list of entries that will be presented in a feed"""
+    """Return a list of entries that will be presented in a feed
+
+    This can also be an async generator that `yield`s entries as they are found (e.g. page
+    by page), so they show up right away and `process_one()` can start on them early.
+
+    Wrap slow steps in `with src.tracing.span("name"):` to see them in the run's timings.
+
+    If the page loads its statements from an API, reading that JSON is much faster than
+    scraping the DOM:
+
+        statements = src.tap.tap(page, r"/api/statements")
+        await page.reload()
+        data = await statements.json()
+        return [Entry(item["id"], item["title"]) for item in data["statements"]]
+
+    Otherwise, `src.extract` reads a whole table (and its other pages) in one round trip
+    per page, instead of one per cell.
+    """
     # TODO: Put this into an explicit init() function
     # await page.goto("{initial_url}")
     print("finding in page...")
@@ -20,5 +37,19 @@ async def find(page: Page) -> list[Entry]:
 
 
 async def process(page: Page, entries: list[Entry]) -> None:
-    """Given a (filtered) list of entries, process them however you wish"""
+    """Given a (filtered) list of entries, process them however you wish
+
+    Downloads are saved automatically to the procedure's download directory. Use
+    `src.downloads.downloads_for(page).downloaded(url=...)` to skip ones you already have.
+    """
     print("processing...")
+
+
+# Alternatively, define `process_one()` instead of `process()` to process each entry on its
+# own page, several at a time. An error or timeout only fails the entry that caused it.
+# PROCESS_PAGES = 4  # How many entries to process at once
+# PROCESS_TIMEOUT = 120  # Seconds allowed per entry
+# RECYCLE_PAGE_AFTER = 100  # Navigations before a page is replaced by a fresh one
+#
+# async def process_one(page: Page, entry: Entry) -> None:
+#     print("processing", entry.id)
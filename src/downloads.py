@@ -0,0 +1,151 @@
+import asyncio
+import hashlib
+import os
+from datetime import datetime
+from pathlib import Path
+from weakref import WeakKeyDictionary
+
+from playwright.async_api import BrowserContext, Download, Page
+from pydantic import BaseModel, Field
+
+from .tracing import span
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class DownloadRecord(BaseModel):
+    sha256: str
+    file_name: str
+    "Name of the file inside the procedure's download directory"
+    url: str
+    suggested_filename: str
+    size: int
+    time: datetime = Field(default_factory=datetime.now)
+
+
+class DownloadManifest(BaseModel):
+    downloads: list[DownloadRecord] = Field(default_factory=list)
+
+
+_managers = WeakKeyDictionary[BrowserContext, "DownloadManager"]()
+
+
+def downloads_for(page: Page) -> "DownloadManager | None":
+    """Return the download manager tracking `page`, so procedures can check what's already
+    been downloaded before triggering a download"""
+    return _managers.get(page.context)
+
+
+class DownloadManager:
+    """
+    Saves every download of a context into `output_dir`, hashing the content while it is
+    copied. Files whose content was already downloaded are not written again, and every
+    saved file is recorded in `manifest.json` so later runs know about it.
+    """
+
+    def __init__(self, output_dir: Path):
+        self.output_dir = output_dir
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.manifest_path = output_dir / "manifest.json"
+        if self.manifest_path.exists():
+            self.manifest = DownloadManifest.model_validate_json(
+                self.manifest_path.read_text()
+            )
+        else:
+            self.manifest = DownloadManifest()
+        self._by_hash = {record.sha256: record for record in self.manifest.downloads}
+        self._pending = set[asyncio.Task[DownloadRecord | None]]()
+        self.saved = list[DownloadRecord]()
+        "Files written during this session"
+        self.skipped = list[DownloadRecord]()
+        "Downloads whose content was already in the manifest"
+
+    def attach(self, context: BrowserContext) -> None:
+        _managers[context] = self
+        for page in context.pages:
+            page.on("download", self._on_download)
+        context.on("page", lambda page: page.on("download", self._on_download))
+
+    def downloaded(
+        self, *, url: str | None = None, filename: str | None = None
+    ) -> DownloadRecord | None:
+        """Return a previous download with the given url or suggested filename"""
+        for record in self.manifest.downloads:
+            if url is not None and record.url == url:
+                return record
+            if filename is not None and record.suggested_filename == filename:
+                return record
+        return None
+
+    def _on_download(self, download: Download) -> None:
+        task = asyncio.create_task(self._save(download))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def wait(self) -> None:
+        """Wait until all in-progress downloads are saved"""
+        while self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+
+    async def _save(self, download: Download) -> DownloadRecord | None:
+        with span("download", url=download.url):
+            source = await download.path()
+        if source is None:
+            return None  # Download failed or was canceled
+        part = self.output_dir / f".{download.suggested_filename}.{id(download)}.part"
+        try:
+            with span("download.save", file=download.suggested_filename):
+                sha256, size = await asyncio.to_thread(_copy_and_hash, source, part)
+
+            if (record := self._by_hash.get(sha256)) and (
+                self.output_dir / record.file_name
+            ).exists():
+                part.unlink()
+                self.skipped.append(record)
+                return record
+
+            path = self._unique_path(download.suggested_filename)
+            os.replace(part, path)
+        finally:
+            # Not `download.delete()`: the procedure may `save_as()` it too. Playwright
+            # deletes it along with the context.
+            part.unlink(missing_ok=True)
+
+        record = DownloadRecord(
+            sha256=sha256,
+            file_name=path.name,
+            url=download.url,
+            suggested_filename=download.suggested_filename,
+            size=size,
+        )
+        self._by_hash[sha256] = record
+        self.manifest.downloads.append(record)
+        self.saved.append(record)
+        self._write_manifest()
+        return record
+
+    def _unique_path(self, file_name: str) -> Path:
+        path = self.output_dir / file_name
+        stem, suffix = path.stem, path.suffix
+        count = 1
+        while path.exists():
+            path = self.output_dir / f"{stem} ({count}){suffix}"
+            count += 1
+        return path
+
+    def _write_manifest(self) -> None:
+        # Write then rename so a crash never leaves a truncated manifest behind
+        tmp = self.manifest_path.with_suffix(".json.tmp")
+        tmp.write_text(self.manifest.model_dump_json(indent=4))
+        os.replace(tmp, self.manifest_path)
+
+
+def _copy_and_hash(source: Path, dest: Path) -> tuple[str, int]:
+    sha256 = hashlib.sha256()
+    size = 0
+    with source.open("rb") as src, dest.open("wb") as dst:
+        while chunk := src.read(CHUNK_SIZE):
+            sha256.update(chunk)
+            dst.write(chunk)
+            size += len(chunk)
+    return sha256.hexdigest(), size
@@ -0,0 +1,49 @@
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable
+
+from .execution import EntryResult
+
+
+class EntryIndex:
+    """Remembers which entries of each procedure were processed, when, and how it went"""
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        with self._db:
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS processed_entries (
+                    procedure TEXT NOT NULL,
+                    entry_id TEXT NOT NULL,
+                    processed_at TEXT NOT NULL,
+                    error TEXT,
+                    PRIMARY KEY (procedure, entry_id)
+                )"""
+            )
+
+    def outcomes(self, procedure: str) -> dict[str, str | None]:
+        """Map each processed entry id to its error, or None if it succeeded"""
+        rows = self._db.execute(
+            "SELECT entry_id, error FROM processed_entries WHERE procedure = ?", (procedure,)
+        )
+        return dict(rows.fetchall())
+
+    def pending(self, procedure: str, ids: Iterable[str]) -> set[str]:
+        """Return the ids that were never processed or failed last time"""
+        outcomes = self.outcomes(procedure)
+        return {id for id in ids if id not in outcomes or outcomes[id] is not None}
+
+    def record(self, procedure: str, results: Iterable[EntryResult]) -> None:
+        now = datetime.now().isoformat()
+        with self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO processed_entries VALUES (?, ?, ?, ?)",
+                [(procedure, result.id, now, result.error) for result in results],
+            )
+
+    def forget(self, procedure: str) -> None:
+        with self._db:
+            self._db.execute("DELETE FROM processed_entries WHERE procedure = ?", (procedure,))
@@ -0,0 +1,84 @@
+import re
+from array import array
+from typing import Any, Iterable, Iterator
+
+NEW, PROCESSED, FAILED = 0, 1, 2
+"Status of an entry in the entry index"
+
+
+class EntryStore:
+    """
+    The entries found by `find()`, kept in parallel arrays indexed by slot (the order they
+    were found in) so tens of thousands of them stay cheap to filter and select
+    """
+
+    def __init__(self) -> None:
+        self.clear()
+
+    def clear(self) -> None:
+        self._entries = list[Any]()
+        self._slots = dict[str, int]()
+        "Slot of each entry id"
+        self._labels = list[str]()
+        "Lowercase labels, for filtering"
+        self.selected = bytearray()
+        self.status = bytearray()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self._entries)
+
+    def entry(self, slot: int) -> Any:
+        return self._entries[slot]
+
+    def add(self, entries: Iterable[Any], outcomes: dict[str, str | None]) -> int:
+        """
+        Add entries (skipping ids already added), pre-selecting new and failed ones. Returns
+        the number added.
+        """
+        added = 0
+        for entry in entries:
+            if entry.id in self._slots:
+                continue
+            self._slots[entry.id] = len(self._entries)
+            self._entries.append(entry)
+            self._labels.append(entry.label.lower())
+            status = _status(outcomes, entry.id)
+            self.status.append(status)
+            self.selected.append(status != PROCESSED)
+            added += 1
+        return added
+
+    def set_outcomes(self, outcomes: dict[str, str | None]) -> None:
+        for slot, entry in enumerate(self._entries):
+            self.status[slot] = _status(outcomes, entry.id)
+
+    def view(self, query: str = "", *, hide_processed: bool = False) -> array:
+        """Slots of the entries whose label fuzzily matches `query` (letters in order)"""
+        pattern = None
+        if query := "".join(query.lower().split()):
+            pattern = re.compile(".*?".join(map(re.escape, query)))
+        return array(
+            "I",
+            (
+                slot
+                for slot, label in enumerate(self._labels)
+                if not (hide_processed and self.status[slot] == PROCESSED)
+                and (pattern is None or pattern.search(label))
+            ),
+        )
+
+    def select(self, slots: Iterable[int], selected: bool = True) -> None:
+        for slot in slots:
+            self.selected[slot] = selected
+
+    def selected_entries(self) -> list[Any]:
+        return [entry for entry, selected in zip(self._entries, self.selected) if selected]
+
+
+def _status(outcomes: dict[str, str | None], id: str) -> int:
+    if id not in outcomes:
+        return NEW
+    return PROCESSED if outcomes[id] is None else FAILED
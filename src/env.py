@@ -4,9 +4,19 @@ from datetime import datetime
 from enum import Enum
 from functools import cached_property
 from pathlib import Path
+from typing import TYPE_CHECKING, Iterable
 
 from pydantic import BaseModel, Field
 
+if TYPE_CHECKING:
+    from .browser import BrowserPool
+    from .entry_index import EntryIndex
+    from .find_cache import FindCache
+    from .run_history import RunHistory
+    from .snapshot_store import SnapshotStore
+    from .store import MetadataStore
+    from .workers import ProcedureWorkerPool
+
 
 class Config(BaseModel):
     edit_file: str | None = None
@@ -14,6 +24,37 @@ class Config(BaseModel):
     (the `"{file}"` is literal and filled at runtime)"""
     editor_in_terminal: bool = True
     "Does the editor take control of the terminal (e.g. vim)"
+    browser_idle_timeout: float | None = 300.0
+    "Seconds an unused browser is kept warm before shutting down. `null` to never shut down"
+    log_files_kept: int = 20
+    "Number of run logs (and traces) kept per procedure"
+    isolated_execution: bool = False
+    "Run procedures in separate worker processes so a runaway procedure can be killed"
+    worker_count: int = 2
+    "Number of worker processes used for isolated execution"
+    worker_timeout: float | None = 300.0
+    "Seconds a procedure may run in a worker before the worker is killed"
+    worker_memory_limit_mb: int | None = 1024
+    "Kill a worker whose resident memory exceeds this (only enforced on Linux)"
+    recycle_page_after: int | None = 100
+    """Navigations after which a page used by `process_one()` is closed and replaced by a
+    fresh one, between entries. `null` to keep pages for the whole run"""
+    browser_memory_limit_mb: int | None = 2048
+    """Replace the browser context (keeping cookies and localStorage) between entries once
+    the browser processes use more resident memory than this (only enforced on Linux)"""
+    daemon_concurrency: int = 4
+    "Maximum number of scheduled procedures the daemon runs at once"
+    daemon_domain_concurrency: int = 1
+    "Maximum number of scheduled procedures running at once against the same domain"
+    daemon_requests_per_second: float | None = 2.0
+    """Maximum page and API requests per second to a single host while the daemon runs. With
+    `isolated_execution`, only the landing page loads for fingerprints are limited"""
+    snapshot_store_max_mb: int | None = 500
+    """Size of the (compressed) snapshot store. The least recently used snapshots are
+    deleted when it grows larger. `null` for no limit"""
+    find_cache_size: int = 100
+    """Number of `find()` results kept to show again when neither the procedure nor the
+    (static or recorded) snapshot changed. The least recently used are dropped"""
     contexts: dict[str, "ContextInfo"] = Field(default_factory=dict)
     "Browser contexts (cookies, localStorage, etc.)"
     procedures: dict[str, "ProcedureInfoConfigOnly"] = Field(default_factory=dict)
@@ -25,12 +66,23 @@ class Config(BaseModel):
         return cls.model_validate_json(path.read_text())
 
     def save_to_path(self, path: Path) -> None:
-        path.write_text(self.model_dump_json(indent=4))
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(self.model_dump_json(indent=4))
+        os.replace(tmp, path)
 
 
 class ProcedureInfoConfigOnly(BaseModel):
     snapshots: list["Snapshot"]
     "A list of snapshots a user can quickly switch between while developing"
+    resource_policy: "ResourcePolicy" = Field(default_factory=lambda: ResourcePolicy())
+    "Requests to block while the procedure runs, to speed up page loads"
+    context: str | None = None
+    """Name of the entry in `Config.contexts` whose persistent browser profile is used.
+    Procedures without one share a context saved to `browser_context.json`"""
+    schedule: "Schedule | None" = None
+    "How often `state_dl daemon` runs the procedure. Never if not set"
+    fingerprint: "Fingerprint | None" = None
+    "What to compare on the landing page to skip runs when nothing changed"
 
 
 class ProcedureInfo(ProcedureInfoConfigOnly):
@@ -41,7 +93,11 @@ class ProcedureInfo(ProcedureInfoConfigOnly):
 
     @staticmethod
     def from_proc(proc: ProcedureInfoConfigOnly, *, name: str) -> "ProcedureInfo":
-        return ProcedureInfo(name=name, snapshots=proc.snapshots)
+        return ProcedureInfo(name=name, **dict(proc))
+
+    @property
+    def initial_url(self) -> str:
+        return self.snapshots[0].uri if self.snapshots else "https://example.com"
 
     def exists(self, ctx: "Context") -> bool:
         """True if the procedure file exists"""
@@ -50,10 +106,17 @@ class ProcedureInfo(ProcedureInfoConfigOnly):
 
 class Snapshot(BaseModel):
     uri: str
-    "A url or sometimes a uri with `file://` schema to point to a local snapshot of the site"
+    """A url, or a `snapshot://<digest>` uri pointing to a page saved in the snapshot store
+    (older snapshots use `file://` uris)"""
     # TODO: would time.delta be better?
     time: datetime = Field(default_factory=datetime.now)
     "An approximate time the snapshot was taken. Mostly for the user's reference."
+    har: Path | None = None
+    "Recorded network traffic of `uri` that is replayed instead of using the network"
+    har_blob: str | None = None
+    "Digest of recorded network traffic in the snapshot store, used instead of `har`"
+    url: str | None = None
+    "The url a static snapshot was taken of"
 
     @property
     def file_name(self) -> Path | None:
@@ -61,10 +124,82 @@ class Snapshot(BaseModel):
         if self.uri.startswith("file://"):
             return Path(self.uri[7:])
 
+    @property
+    def recorded(self) -> bool:
+        """True if the snapshot replays recorded traffic"""
+        return self.har is not None or self.har_blob is not None
+
+    @property
+    def blobs(self) -> set[str]:
+        """Digests of the snapshot store blobs this snapshot uses"""
+        from .snapshot_store import SCHEME
+
+        blobs = {self.har_blob} if self.har_blob else set()
+        if self.uri.startswith(SCHEME):
+            blobs.add(self.uri.removeprefix(SCHEME))
+        return blobs
+
+    @property
+    def live_url(self) -> str | None:
+        """The url of the page the snapshot shows, if known"""
+        if self.uri.startswith(("http://", "https://")):
+            return self.uri
+        return self.url
+
+    def files_exist(self, ctx: "Context") -> bool:
+        """False if the static snapshot or recorded traffic was deleted"""
+        if self.file_name is not None and not self.file_name.exists():
+            return False
+        if not all(ctx.snapshot_store.has(digest) for digest in self.blobs):
+            return False
+        return self.har is None or self.har.exists()
+
+
+class ResourcePolicy(BaseModel):
+    block_resource_types: list[str] = Field(default_factory=list)
+    "Playwright resource types to block, e.g. `image`, `font`, `media` or `stylesheet`"
+    block_domains: list[str] = Field(default_factory=list)
+    "Block requests to these domains and their subdomains (analytics, ads, etc.)"
+    block_url_patterns: list[str] = Field(default_factory=list)
+    "Block urls matching any of these regular expressions"
+
+    def __bool__(self) -> bool:
+        return bool(self.block_resource_types or self.block_domains or self.block_url_patterns)
+
+
+class Schedule(BaseModel):
+    interval_minutes: float
+    "Time between the start of one run and the next"
+    jitter_minutes: float = 5.0
+    "Delay each run by a random amount up to this, so runs don't line up"
+    retries: int = 3
+    "Number of times a failed run is retried, with exponential backoff, before giving up"
+    timeout_minutes: float | None = 30.0
+    "Give up on a run that takes longer than this"
+
+
+class Fingerprint(BaseModel):
+    """
+    Parts of the landing page (`ProcedureInfo.initial_url`) that change whenever there is a
+    new statement. Runs are skipped while they stay the same.
+    """
+
+    selector: str | None = None
+    "CSS selector of the statement list. The text of every match is compared"
+    response_pattern: str | None = None
+    "Regular expression of the urls of API responses to compare (e.g. `/api/statements`)"
+    timeout_seconds: float = 15.0
+    "How long to wait for the selector or responses to show up"
+
 
 class ContextInfo(BaseModel):
+    """
+    A browser profile (cookies, localStorage, IndexedDB, HTTP cache) that is kept in
+    `contexts/<name>` and reused by every procedure that names it
+    """
+
     display_name: str
-    browser: "BrowserEnum"
+    browser: "BrowserEnum" = Field(default_factory=lambda: BrowserEnum.chromium)
 
 
 class BrowserEnum(str, Enum):
@@ -77,46 +212,138 @@ class Context:
     home_p = (Path.home() / ".local/share/state_dl").resolve()
     procedures_dir_p = home_p / "procedure_scripts"
     config_p = home_p / "data.json"
+    "Legacy config file, only read once to import it into the metadata store"
+    store_p = home_p / "data.sqlite3"
 
-    def __init__(self, config: Config) -> None:
+    def __init__(self, config: Config, store: "MetadataStore") -> None:
         self._config = config
+        self.store = store
         sys.path.append(str(self.procedures_dir_p))
 
         self.editor_in_terminal = config.editor_in_terminal
+        self.isolated_execution = config.isolated_execution
+        self.contexts = config.contexts
+        self.recycle_page_after = config.recycle_page_after
+        self.browser_memory_limit_mb = config.browser_memory_limit_mb
 
         if self._config.edit_file:
             self.edit_file = self._config.edit_file
         else:
-            editor = os.environ["VISUAL"] or os.environ["EDITOR"] or "/bin/nano"
+            editor = os.environ.get("VISUAL") or os.environ.get("EDITOR") or "/bin/nano"
             self.edit_file = editor + ' "{file}"'
 
-        save_to_disk = False
-
         existing_procs = {proc.stem: proc for proc in self.procedures_dir_p.glob("*.py")}
         if untracked := existing_procs.keys() - self._config.procedures.keys():
-            save_to_disk = True
             for proc_name in untracked:
                 # When there is more data about a procedure, like which browser context to use,
                 # I will use the defaults and have the name say it's <UNTRACKED> or something
                 self._config.procedures[proc_name] = ProcedureInfoConfigOnly(snapshots=[])
+                self.store.save_procedure(proc_name, self._config.procedures[proc_name])
+
+        self.all_procedures = {
+            name: ProcedureInfo.from_proc(proc, name=name)
+            for name, proc in self._config.procedures.items()
+        }
+
+    def prune_snapshots(self, names: Iterable[str] | None = None) -> None:
+        """
+        Forget the snapshots of the named procedures (or all of them) whose files were
+        deleted. Not done on startup since it stats every snapshot's files.
+        """
+        # TODO: Technically, there is also the issue where a file exists that is not
+        # TODO: tracked by the config (similar to procedure files), but that is less
+        # TODO: of a concern here since the directory will probably be deleted anyways
+        for name in list(self._config.procedures) if names is None else names:
+            if (proc := self._config.procedures.get(name)) is None:
+                continue
+            if missing := [snap for snap in proc.snapshots if not snap.files_exist(self)]:
+                proc.snapshots = [snap for snap in proc.snapshots if snap not in missing]
+                self.store.remove_snapshots(name, missing)
+                if name in self.all_procedures:
+                    self.all_procedures[name].snapshots = proc.snapshots.copy()
 
-        self.all_procedures = dict[str, ProcedureInfo]()
+    @cached_property
+    def browser_pool(self) -> "BrowserPool":
+        # Imported here to avoid loading playwright just to read the config
+        from .browser import BrowserPool
+
+        return BrowserPool(
+            idle_timeout=self._config.browser_idle_timeout,
+            remote_debugging=self.isolated_execution,
+        )
+
+    @cached_property
+    def worker_pool(self) -> "ProcedureWorkerPool":
+        from .workers import ProcedureWorkerPool
+
+        return ProcedureWorkerPool(
+            self,
+            size=self._config.worker_count,
+            timeout=self._config.worker_timeout,
+            memory_limit_mb=self._config.worker_memory_limit_mb,
+        )
+
+    async def close(self) -> None:
+        """Stop the worker processes and browsers, if they were started"""
+        if "worker_pool" in self.__dict__:
+            self.worker_pool.close()
+        if "browser_pool" in self.__dict__:
+            await self.browser_pool.close()
+
+    @cached_property
+    def entry_index(self) -> "EntryIndex":
+        from .entry_index import EntryIndex
+
+        return EntryIndex(self.home_p / "index.sqlite3")
+
+    @cached_property
+    def run_history(self) -> "RunHistory":
+        from .run_history import RunHistory
+
+        # Its tables used to be part of the entry index, so they are kept in the same file
+        return RunHistory(self.home_p / "index.sqlite3")
+
+    @cached_property
+    def find_cache(self) -> "FindCache":
+        from .find_cache import FindCache
+
+        return FindCache(self.home_p / "find_cache.sqlite3", self._config.find_cache_size)
+
+    @cached_property
+    def snapshot_store(self) -> "SnapshotStore":
+        from .snapshot_store import SnapshotStore
+
+        max_mb = self._config.snapshot_store_max_mb
+        return SnapshotStore(
+            self.home_p / "snapshots",
+            self.store,
+            None if max_mb is None else max_mb * 1024**2,
+        )
+
+    def evict_snapshots(self, keep: Iterable[str] = ()) -> set[str]:
+        """
+        Shrink the snapshot store to its size limit, removing the snapshots of evicted blobs
+        from every procedure. Returns the evicted digests.
+        """
+        if not (evicted := self.snapshot_store.evict(keep)):
+            return evicted
         for name, proc in self._config.procedures.items():
-            # TODO: Technically, there is also the issue where a file exists that is not
-            # TODO: tracked by the config (similar to procedure files), but that is less
-            # TODO: of a concern here since the directory will probably be deleted anyways
-            len_before_filter = len(proc.snapshots)
-            proc.snapshots = [
-                snap
-                for snap in proc.snapshots
-                # Filter out static snapshots that no longer exist
-                if snap.file_name is None or snap.file_name.exists()
-            ]
-            self.all_procedures[name] = ProcedureInfo.from_proc(proc, name=name)
-            save_to_disk = save_to_disk or len_before_filter > len(proc.snapshots)
-
-        if save_to_disk:
-            self._config.save_to_path(self.config_p)
+            proc.snapshots = [snap for snap in proc.snapshots if not snap.blobs & evicted]
+            if name in self.all_procedures:
+                self.all_procedures[name].snapshots = proc.snapshots.copy()
+        return evicted
+
+    def new_log_path(self, proc_name: str) -> Path:
+        from .logs import rotating_path
+
+        keep = self._config.log_files_kept
+        return rotating_path(self.home_p / "logs" / proc_name, suffix=".log", keep=keep)
+
+    def new_trace_path(self, proc_name: str) -> Path:
+        from .logs import rotating_path
+
+        keep = self._config.log_files_kept
+        return rotating_path(self.home_p / "traces" / proc_name, suffix=".json", keep=keep)
 
     @cached_property
     def default_procedure_snippet(self):
@@ -0,0 +1,214 @@
+import asyncio
+import inspect
+import time
+import traceback
+from dataclasses import dataclass
+from types import ModuleType
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Iterable
+
+from playwright.async_api import Page
+
+from .browser import BrowserWrapper
+from .recycling import Recycler
+from .tracing import span
+
+DEFAULT_PROCESS_PAGES = 4
+BATCH_SIZE = 50
+BATCH_INTERVAL = 0.1
+"Seconds to wait for more entries before handing over an incomplete batch"
+
+_DONE = object()
+
+
+@dataclass
+class EntryResult:
+    id: str
+    elapsed: float
+    "Wall time in seconds"
+    error: str | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class FindError(Exception):
+    """
+    `find()` raised while `process_each()` was processing the entries it found until then,
+    whose results are in `results`
+    """
+
+    def __init__(self, message: str, results: list[EntryResult]):
+        super().__init__(message)
+        self.results = results
+
+
+async def iter_find(module: ModuleType, page: Page) -> AsyncIterator[Any]:
+    """Yield the entries found by `find()`, whether it returns them or is an async generator"""
+    with span("find()"):
+        found = module.find(page)
+        if inspect.isasyncgen(found):
+            async for entry in found:
+                yield entry
+            return
+
+        entries = await found
+    assert isinstance(entries, list), "expected `find()` to return list[Entry]"
+    for entry in entries:
+        yield entry
+
+
+async def batched(
+    entries: AsyncIterable[Any], *, size: int = BATCH_SIZE, interval: float = BATCH_INTERVAL
+) -> AsyncIterator[list[Any]]:
+    """
+    Group entries into lists of up to `size`, handing over what there is whenever no new
+    entry arrived for `interval` seconds (e.g. while `find()` loads the next page)
+    """
+    queue = asyncio.Queue[Any]()
+
+    async def _pull() -> None:
+        try:
+            async for entry in entries:
+                queue.put_nowait(entry)
+        finally:
+            queue.put_nowait(_DONE)
+
+    task = asyncio.create_task(_pull())
+    try:
+        batch = list[Any]()
+        while True:
+            try:
+                entry = await asyncio.wait_for(queue.get(), interval if batch else None)
+            except asyncio.TimeoutError:
+                yield batch
+                batch = []
+                continue
+            if entry is _DONE:
+                break
+            batch.append(entry)
+            if len(batch) >= size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+        await task  # Raise what `entries` raised, if anything
+    finally:
+        task.cancel()
+
+
+async def process_each(
+    recycler: Recycler,
+    process_one: Callable[[Page, Any], Awaitable[None]],
+    entries: Iterable[Any] | AsyncIterable[Any],
+    *,
+    pages: int,
+    timeout: float | None = None,
+    on_result: Callable[[EntryResult], object] | None = None,
+) -> list[EntryResult]:
+    """
+    Fan `process_one(page, entry)` out over up to `pages` pages handed out by `recycler`,
+    which replaces them (or the whole context) between entries. Each entry gets its own
+    timeout and an exception only fails the entry that raised it. Results are passed to
+    `on_result` as soon as each entry is done, so they aren't lost if the run is cancelled.
+
+    `entries` can be an async iterable (e.g. from a paginating `find()`), in which case the
+    first entries are processed while later ones are still being found. If it raises, the
+    entries it yielded are still processed, then `FindError` is raised with their results.
+    """
+    queue = asyncio.Queue[Any]()
+    results = list[EntryResult]()
+
+    async def _produce() -> None:
+        try:
+            if isinstance(entries, AsyncIterable):
+                async for entry in entries:
+                    queue.put_nowait(entry)
+            else:
+                for entry in entries:
+                    queue.put_nowait(entry)
+        finally:
+            for _ in range(pages):
+                queue.put_nowait(_DONE)
+
+    async def _worker() -> None:
+        page: Page | None = None
+        try:
+            while (entry := await queue.get()) is not _DONE:
+                page = await recycler.acquire(page)
+                start = time.perf_counter()
+                error = None
+                try:
+                    with span("process_one()", entry=entry.id):
+                        await asyncio.wait_for(process_one(page, entry), timeout=timeout)
+                except asyncio.TimeoutError:
+                    error = f"Timed out after {timeout}s"
+                except Exception as e:
+                    traceback.print_exc()
+                    error = f"{e.__class__.__name__}: {e}"
+                finally:
+                    await recycler.release()
+                result = EntryResult(entry.id, time.perf_counter() - start, error)
+                results.append(result)
+                if on_result:
+                    on_result(result)
+        finally:
+            if page is not None and not page.is_closed():
+                await page.close()
+
+    producer = asyncio.create_task(_produce())
+    if isinstance(entries, AsyncIterable):
+        # Entries may come from a `find()` still running on the wrapper's page, which
+        # replacing the context would close
+        recycler.defer_recycling(producer)
+    await asyncio.gather(*(_worker() for _ in range(pages)))
+    try:
+        await producer
+    except Exception as e:
+        raise FindError(f"{e.__class__.__name__}: {e}", results) from e
+    return results
+
+
+async def run_process(
+    wrapper: BrowserWrapper,
+    module: ModuleType,
+    entries: list[Any] | AsyncIterable[Any],
+    *,
+    on_result: Callable[[EntryResult], object] | None = None,
+) -> list[EntryResult]:
+    """
+    Call the procedure's `process_one()` in parallel if it defines one, otherwise pass every
+    entry to `process()` on the wrapper's page at once (and they all fail together). See
+    `process_each()` for `on_result`.
+    """
+    if hasattr(module, "process_one"):
+        recycler = Recycler(
+            wrapper,
+            max_navigations=getattr(module, "RECYCLE_PAGE_AFTER", wrapper.recycle_page_after),
+            memory_limit_mb=wrapper.browser_memory_limit_mb,
+        )
+        return await process_each(
+            recycler,
+            module.process_one,
+            entries,
+            pages=getattr(module, "PROCESS_PAGES", DEFAULT_PROCESS_PAGES),
+            timeout=getattr(module, "PROCESS_TIMEOUT", None),
+            on_result=on_result,
+        )
+
+    if isinstance(entries, AsyncIterable):
+        entries = [entry async for entry in entries]
+    start = time.perf_counter()
+    error = None
+    try:
+        with span("process()", entries=len(entries)):
+            await module.process(wrapper.page, entries)
+    except Exception as e:
+        traceback.print_exc()
+        error = f"{e.__class__.__name__}: {e}"
+    elapsed = time.perf_counter() - start
+    results = [EntryResult(entry.id, elapsed, error) for entry in entries]
+    if on_result:
+        for result in results:
+            on_result(result)
+    return results
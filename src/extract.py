@@ -0,0 +1,131 @@
+import re
+from typing import Any, AsyncIterator
+
+from playwright.async_api import Frame, Page
+
+from .tracing import span
+
+_FIELD = re.compile(r"(.*?)@([\w:-]+)")
+
+_EXTRACT_JS = """([rows, fields]) => Array.from(document.querySelectorAll(rows), row => {
+    const record = {};
+    for (const [name, [selector, attr]] of Object.entries(fields)) {
+        const element = selector ? row.querySelector(selector) : row;
+        let value = null;
+        if (element === null) {
+        } else if (attr === null) {
+            value = element.innerText;
+        } else if ((attr === "href" || attr === "src") && element.hasAttribute(attr)) {
+            value = element[attr];  // The absolute url
+        } else {
+            value = element.getAttribute(attr);
+        }
+        record[name] = typeof value === "string" ? value.trim() : value;
+    }
+    return record;
+})"""
+
+_TABLE_JS = """selector => {
+    const table = document.querySelector(selector);
+    if (table === null) return null;
+    let rows = Array.from(table.rows);
+    let header = table.tHead ? table.tHead.rows[0] : rows[0];
+    rows = rows.filter(row => row !== header && row.parentElement !== table.tHead);
+    const names = Array.from(header ? header.cells : [], (cell, i) =>
+        cell.innerText.trim() || `column_${i}`
+    );
+    return rows.map(row => Object.fromEntries(
+        Array.from(row.cells, (cell, i) => [names[i] || `column_${i}`, cell.innerText.trim()])
+    ));
+}"""
+
+_NEXT_JS = """([rows, next]) => {
+    const button = document.querySelector(next);
+    if (button === null || button.disabled || button.getAttribute("aria-disabled") === "true"
+        || button.classList.contains("disabled")) {
+        return false;
+    }
+    // Marks the current rows, so the wait below can tell when they were replaced
+    document.querySelectorAll(rows).forEach(row => row.setAttribute("data-state-dl-seen", ""));
+    button.click();
+    return true;
+}"""
+
+_NEW_ROWS_JS = """rows => {
+    const row = document.querySelector(rows);
+    return row !== null && !row.hasAttribute("data-state-dl-seen");
+}"""
+
+
+async def extract(
+    page: Page | Frame, rows: str, fields: dict[str, str]
+) -> list[dict[str, str | None]]:
+    """
+    Return one record per element matching the `rows` selector. `fields` maps each record
+    key to what to read, relative to the row:
+
+    - `"td.date"`: the text of the first match of a selector
+    - `"a@href"`: an attribute of it (`href` and `src` are made absolute)
+    - `"@data-id"`: an attribute of the row itself, `""` for the row's text
+
+    Missing elements or attributes are None. The records can be turned into entries with
+    `[Entry(**record) for record in records]`.
+    """
+    # Lists, as Playwright doesn't serialize tuples
+    parsed = dict[str, list[str | None]]()
+    for name, spec in fields.items():
+        if match := _FIELD.fullmatch(spec):
+            parsed[name] = [match[1].strip(), match[2]]
+        else:
+            parsed[name] = [spec.strip(), None]
+    with span("extract", rows=rows):
+        return await page.evaluate(_EXTRACT_JS, [rows, parsed])
+
+
+async def extract_table(page: Page | Frame, selector: str) -> list[dict[str, str]]:
+    """
+    Return the rows of an HTML table as dicts keyed by the column headers (from `<thead>`,
+    or else the first row). Columns without a header are named `column_<index>`.
+    """
+    with span("extract_table", selector=selector):
+        records = await page.evaluate(_TABLE_JS, selector)
+    if records is None:
+        raise ValueError(f"No table matches {selector!r}")
+    return records
+
+
+async def paginate(
+    page: Page, rows: str, next: str, *, max_pages: int | None = None, timeout: float = 30
+) -> AsyncIterator[int]:
+    """
+    Yield the page number (starting at 1) for every page of a paginated list, clicking the
+    `next` button or link in between until it is missing or disabled. Works whether the
+    next page is a new document or rendered in place, as long as the `rows` are replaced.
+
+        async for _ in paginate(page, "tr.statement", "a.next"):
+            for record in await extract(page, "tr.statement", ...):
+                yield Entry(**record)
+    """
+    number = 1
+    while True:
+        yield number
+        if max_pages is not None and number >= max_pages:
+            return
+        if not await page.evaluate(_NEXT_JS, [rows, next]):
+            return
+        number += 1
+        with span("paginate", page=number):
+            await page.wait_for_function(_NEW_ROWS_JS, arg=rows, timeout=timeout * 1000)
+
+
+async def extract_pages(
+    page: Page,
+    rows: str,
+    fields: dict[str, str],
+    *,
+    next: str,
+    max_pages: int | None = None,
+) -> AsyncIterator[list[dict[str, Any]]]:
+    """`extract()` the rows of every page, see `paginate()`"""
+    async for _ in paginate(page, rows, next, max_pages=max_pages):
+        yield await extract(page, rows, fields)
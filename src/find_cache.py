@@ -0,0 +1,131 @@
+import hashlib
+import pickle
+import sqlite3
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+from .env import Snapshot
+
+
+@dataclass
+class CachedFind:
+    snapshot: Snapshot
+    entries: list[dict[str, Any]]
+    "The fields of every entry found"
+    output: str
+    "What the run printed"
+    found_at: datetime
+
+
+def source_hash(source: bytes) -> str:
+    return hashlib.sha256(source).hexdigest()
+
+
+def cacheable(snapshot: Snapshot | None) -> bool:
+    """
+    Whether `find()` gives the same result every time it runs on `snapshot`. Snapshots
+    that are just a url (live ones) change along with the site.
+    """
+    return snapshot is not None and bool(snapshot.blobs or snapshot.file_name or snapshot.har)
+
+
+def snapshot_key(snapshot: Snapshot) -> str:
+    """Identifies the content of a snapshot (the time is only for the user's reference)"""
+    return snapshot.model_dump_json(exclude={"time"})
+
+
+class FindCache:
+    """
+    Remembers what `find()` returned for a procedure's source and a (static or recorded)
+    snapshot, so `EditProcedure` can show the entries again without running the browser.
+    Only the `max_results` most recently used results are kept.
+    """
+
+    def __init__(self, path: Path, max_results: int):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_results = max_results
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        with self._db:
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS results (
+                    procedure TEXT NOT NULL,
+                    source_hash TEXT NOT NULL,
+                    snapshot TEXT NOT NULL,
+                    entries BLOB NOT NULL,
+                    output TEXT NOT NULL,
+                    found_at TEXT NOT NULL,
+                    last_used TEXT NOT NULL,
+                    PRIMARY KEY (procedure, source_hash, snapshot)
+                )"""
+            )
+
+    def get(self, procedure: str, source_hash: str, snapshot: Snapshot) -> CachedFind | None:
+        key = (procedure, source_hash, snapshot_key(snapshot))
+        row = self._db.execute(
+            """SELECT entries, output, found_at FROM results
+            WHERE procedure = ? AND source_hash = ? AND snapshot = ?""",
+            key,
+        ).fetchone()
+        if row is None:
+            return None
+        with self._db:
+            self._db.execute(
+                """UPDATE results SET last_used = ?
+                WHERE procedure = ? AND source_hash = ? AND snapshot = ?""",
+                (datetime.now().isoformat(), *key),
+            )
+        entries, output, found_at = row
+        try:
+            fields = pickle.loads(entries)
+        except Exception:
+            return None  # E.g. a field's class no longer exists
+        return CachedFind(snapshot, fields, output, datetime.fromisoformat(found_at))
+
+    def latest(self, procedure: str, source_hash: str) -> CachedFind | None:
+        """The most recently used result for this source, whichever snapshot it was for"""
+        row = self._db.execute(
+            """SELECT snapshot FROM results WHERE procedure = ? AND source_hash = ?
+            ORDER BY last_used DESC LIMIT 1""",
+            (procedure, source_hash),
+        ).fetchone()
+        if row is None:
+            return None
+        return self.get(procedure, source_hash, Snapshot.model_validate_json(row[0]))
+
+    def put(
+        self,
+        procedure: str,
+        source_hash: str,
+        snapshot: Snapshot,
+        entries: list[dict[str, Any]],
+        output: str,
+    ) -> bool:
+        """Store a result, returning False if its entries can't be stored"""
+        try:
+            pickled = pickle.dumps(entries)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            return False
+        now = datetime.now().isoformat()
+        key = snapshot_key(snapshot)
+        with self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (procedure, source_hash, key, pickled, output, now, now),
+            )
+            self._db.execute(
+                """DELETE FROM results WHERE rowid NOT IN (
+                    SELECT rowid FROM results ORDER BY last_used DESC LIMIT ?
+                )""",
+                (self.max_results,),
+            )
+        return True
+
+    def invalidate(self, procedure: str) -> int:
+        """Forget every result of `procedure`, returning how many there were"""
+        with self._db:
+            return self._db.execute(
+                "DELETE FROM results WHERE procedure = ?", (procedure,)
+            ).rowcount
@@ -0,0 +1,65 @@
+import hashlib
+from typing import TYPE_CHECKING
+
+from playwright.async_api import Error, Page
+
+from .tap import ResponseTap
+from .tracing import span
+
+if TYPE_CHECKING:
+    from .env import Fingerprint
+
+
+class FingerprintRecorder:
+    """
+    Hashes the parts of a procedure's landing page described by its `Fingerprint`, so a
+    run can tell whether anything changed since last time without running `find()`
+    """
+
+    def __init__(self, spec: "Fingerprint"):
+        self.spec = spec
+        self._tap: ResponseTap | None = None
+
+    def attach(self, page: Page) -> None:
+        """Start collecting matching responses. Call before navigating to the page."""
+        if self.spec.response_pattern:
+            self._tap = ResponseTap(self.spec.response_pattern).attach(page.context)
+
+    async def compute(self, page: Page) -> str | None:
+        """Return the fingerprint of the loaded page, or None if nothing could be hashed"""
+        with span("fingerprint"):
+            try:
+                return await self._compute(page)
+            finally:
+                if self._tap is not None:
+                    self._tap.close()
+
+    async def _compute(self, page: Page) -> str | None:
+        digest = hashlib.sha256()
+        found = False
+        timeout = self.spec.timeout_seconds * 1000
+        if self.spec.selector:
+            try:
+                await page.wait_for_selector(self.spec.selector, timeout=timeout)
+            except Error:
+                return None
+            # One round trip for every match, rather than one per element
+            texts = await page.eval_on_selector_all(
+                self.spec.selector, "elements => elements.map(e => e.innerText)"
+            )
+            for text in texts:
+                digest.update(" ".join(text.split()).encode() + b"\0")
+            found = bool(texts)
+        if self._tap is not None:
+            if not self._tap.responses:
+                try:
+                    await page.wait_for_load_state("networkidle", timeout=timeout)
+                except Error:
+                    pass
+            await self._tap.settle()
+            # Sorted, so the order responses arrived in doesn't matter
+            for response in sorted(self._tap.responses, key=lambda r: (r.url, r.body)):
+                if response.ok:
+                    digest.update(response.url.encode() + b"\0" + response.body + b"\0")
+                    found = True
+        return digest.hexdigest() if found else None
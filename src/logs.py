@@ -0,0 +1,75 @@
+import io
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Callable
+
+MAX_LINES = 1000
+"Lines of a run's output kept in memory (the log file has all of them)"
+MAX_LINE_LENGTH = 10_000
+"Output without a newline is split into lines this long, so it can't grow without limit"
+
+
+class RunLog(io.TextIOBase):
+    """
+    File-like sink for a procedure's stdout/stderr. Complete lines are passed to `on_line`
+    as soon as they are written, the last `max_lines` are kept in `lines`, and everything is
+    appended to the log file at `path`.
+    """
+
+    def __init__(
+        self,
+        path: Path | None,
+        *,
+        on_line: Callable[[str], object] | None = None,
+        max_lines: int = MAX_LINES,
+    ):
+        self.path = path
+        self.lines = deque[str](maxlen=max_lines)
+        self._on_line = on_line
+        self._partial = ""
+        self._file = path.open("w") if path else None
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        if self._file:
+            self._file.write(text)
+        *complete, self._partial = (self._partial + text).split("\n")
+        while len(self._partial) > MAX_LINE_LENGTH:
+            complete.append(self._partial[:MAX_LINE_LENGTH])
+            self._partial = self._partial[MAX_LINE_LENGTH:]
+        for line in complete:
+            self._add_line(line)
+        return len(text)
+
+    def flush(self) -> None:
+        if self._file:
+            self._file.flush()
+
+    def close(self) -> None:
+        if self._partial:
+            self._add_line(self._partial)
+            self._partial = ""
+        if self._file:
+            self._file.close()
+            self._file = None
+        super().close()
+
+    def _add_line(self, line: str) -> None:
+        self.lines.append(line)
+        if self._on_line:
+            self._on_line(line)
+
+
+def rotating_path(directory: Path, *, suffix: str, keep: int) -> Path:
+    """
+    Return a new timestamped path in `directory` for a run's log (or trace, etc.), deleting
+    all but the newest `keep` files with the same suffix
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    old_files = sorted(directory.glob(f"*{suffix}"))
+    for path in old_files[: max(0, len(old_files) - keep + 1)]:
+        path.unlink(missing_ok=True)
+    return directory / f"{datetime.now():%Y-%m-%d_%H-%M-%S.%f}{suffix}"
@@ -1,5 +1,143 @@
-from .app import MyApp
+import argparse
+import atexit
+import sys
+from pathlib import Path
 
 
 def main():
+    parser = argparse.ArgumentParser(prog="state_dl")
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="Print how long startup and each import took when exiting",
+    )
+    commands = parser.add_subparsers(dest="command")
+
+    run = commands.add_parser("run", help="Run procedures without the TUI (e.g. from cron)")
+    run.add_argument("procedures", nargs="*", help="Names of the procedures to run")
+    run.add_argument("--all", action="store_true", help="Run every procedure")
+    run.add_argument(
+        "-j",
+        "--concurrency",
+        type=int,
+        default=4,
+        help="Maximum number of procedures running at once (default: %(default)s)",
+    )
+    run.add_argument(
+        "--timeout",
+        type=float,
+        default=None,
+        help=(
+            "Timeout in seconds for each procedure, landing page included (isolated runs are"
+            " also limited by worker_timeout)"
+        ),
+    )
+    run.add_argument("--headed", action="store_true", help="Show the browser windows")
+    run.add_argument(
+        "--reprocess",
+        action="store_true",
+        help="Process every entry, not just new ones and ones that failed last time",
+    )
+    run.add_argument(
+        "--force",
+        action="store_true",
+        help="Run procedures even if their landing page hasn't changed since the last run",
+    )
+
+    daemon = commands.add_parser(
+        "daemon", help="Keep running and run procedures that have a schedule when they are due"
+    )
+    daemon.add_argument("--headed", action="store_true", help="Show the browser windows")
+
+    snapshot = commands.add_parser(
+        "snapshot", help="Take a fresh static snapshot of each procedure's site in parallel"
+    )
+    snapshot.add_argument("procedures", nargs="*", help="Names of the procedures")
+    snapshot.add_argument("--all", action="store_true", help="Snapshot every procedure")
+    snapshot.add_argument(
+        "-j",
+        "--concurrency",
+        type=int,
+        default=8,
+        help="Maximum number of pages loading at once (default: %(default)s)",
+    )
+    snapshot.add_argument(
+        "--timeout",
+        type=float,
+        default=60.0,
+        help="Timeout in seconds for each site (default: %(default)s)",
+    )
+    snapshot.add_argument("--headed", action="store_true", help="Show the browser windows")
+
+    config = commands.add_parser(
+        "config", help="Export the metadata to JSON (e.g. to edit it by hand) or import it"
+    )
+    config.add_argument("action", choices=["export", "import"])
+    config.add_argument(
+        "path", type=Path, nargs="?", help="JSON file (default: the legacy data.json)"
+    )
+
+    args = parser.parse_args()
+
+    if args.profile_startup:
+        from .startup import StartupProfiler
+
+        profiler = StartupProfiler()
+        profiler.start()
+        atexit.register(profiler.report)
+
+    if args.command == "config":
+        from .env import Config, Context
+        from .store import MetadataStore
+
+        store = MetadataStore(Context.store_p)
+        path = args.path or Context.config_p
+        if args.action == "export":
+            store.load().save_to_path(path)
+        else:
+            store.save_config(Config.load_from_path(path))
+        return
+
+    if args.command == "daemon":
+        from .daemon import run as run_daemon
+
+        run_daemon(headless=not args.headed)
+        return
+
+    if args.command == "snapshot":
+        if bool(args.all) == bool(args.procedures):
+            snapshot.error("specify either --all or a list of procedures")
+        if args.concurrency < 1:
+            snapshot.error("--concurrency must be at least 1")
+        from .snapshot_refresh import run as refresh_snapshots
+
+        sys.exit(
+            refresh_snapshots(
+                None if args.all else args.procedures,
+                concurrency=args.concurrency,
+                headless=not args.headed,
+                timeout=args.timeout,
+            )
+        )
+
+    if args.command == "run":
+        if bool(args.all) == bool(args.procedures):
+            run.error("specify either --all or a list of procedures")
+        if args.concurrency < 1:
+            run.error("--concurrency must be at least 1")
+        from .runner import run as run_procedures
+
+        sys.exit(
+            run_procedures(
+                None if args.all else args.procedures,
+                concurrency=args.concurrency,
+                headless=not args.headed,
+                timeout=args.timeout,
+                reprocess=args.reprocess,
+                force=args.force,
+            )
+        )
+
+    from .app import MyApp
+
     MyApp().run()
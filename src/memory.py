@@ -0,0 +1,53 @@
+import os
+import sys
+from pathlib import Path
+
+
+def rss_mb(pid: int) -> float | None:
+    """Resident memory of a process, or None if unknown (e.g. not on Linux)"""
+    try:
+        with open(f"/proc/{pid}/statm") as file:
+            pages = int(file.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE") / 1024**2
+
+
+def _children() -> dict[int, list[int]]:
+    children = dict[int, list[int]]()
+    for stat in Path("/proc").glob("[0-9]*/stat"):
+        try:
+            # The command name may contain spaces and parentheses, the fields after it don't
+            fields = stat.read_text().rsplit(")", 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        children.setdefault(int(fields[1]), []).append(int(stat.parent.name))
+    return children
+
+
+def browser_rss_mb(root: int | None = None) -> float | None:
+    """
+    Total resident memory of the processes started (directly or not) by `root`, which is
+    the current process by default, except for Python ones (i.e. workers). With playwright,
+    that is its driver and the browsers with all of their renderer processes. None if
+    unknown.
+
+    Memory shared between the processes is counted once per process, so this overestimates
+    what the browsers would free.
+    """
+    if not Path("/proc/self/stat").exists():
+        return None
+    python = os.path.realpath(sys.executable)
+    children = _children()
+    pending = list(children.get(os.getpid() if root is None else root, ()))
+    total = 0.0
+    while pending:
+        pid = pending.pop()
+        pending.extend(children.get(pid, ()))
+        try:
+            if os.path.realpath(f"/proc/{pid}/exe") == python:
+                continue
+        except OSError:
+            pass
+        total += rss_mb(pid) or 0.0
+    return total
@@ -0,0 +1,15 @@
+import importlib
+import sys
+from types import ModuleType
+
+from .env import Context
+from .tracing import span
+
+
+def import_procedure(ctx: Context, name: str) -> ModuleType:
+    """Import the procedure module `name`, reloading it if it was already imported"""
+    module = sys.modules.get(name)
+    with span("procedure.import", name=name, reload=module is not None):
+        if module is None:
+            return importlib.import_module(name=name, package=ctx.procedures_dir_p.stem)
+        return importlib.reload(module)
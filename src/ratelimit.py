@@ -0,0 +1,58 @@
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+from playwright.async_api import Route
+
+LIMITED_RESOURCE_TYPES = {"document", "xhr", "fetch"}
+"Requests that hit the site's servers. Assets are usually served by a CDN and not limited."
+
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second on average, with bursts of up to `burst`"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        # The lock makes waiters take turns, so a steady stream can't starve anyone
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                refill = (now - self._updated) * self.rate
+                self._tokens = min(self.burst, self._tokens + refill)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class RateLimiter:
+    """
+    Delays requests so that no host gets more than `rate` of them per second, across every
+    context it is installed in (see `BrowserWrapper.init()`)
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = dict[str, TokenBucket]()
+        self.delayed = 0
+        "Number of requests that had to wait"
+
+    async def handle(self, route: Route) -> None:
+        request = route.request
+        if request.resource_type in LIMITED_RESOURCE_TYPES:
+            host = (urlsplit(request.url).hostname or "").lower()
+            if host not in self._buckets:
+                self._buckets[host] = TokenBucket(self.rate, self.burst)
+            start = time.monotonic()
+            await self._buckets[host].acquire()
+            if time.monotonic() - start > 0.001:
+                self.delayed += 1
+        await route.fallback()
@@ -0,0 +1,122 @@
+import asyncio
+import time
+from typing import TYPE_CHECKING, Any
+
+from playwright.async_api import Frame, Page
+
+if TYPE_CHECKING:
+    from .browser import BrowserWrapper
+
+MEMORY_CHECK_INTERVAL = 5.0
+"Seconds between measurements of the browser's memory, which means scanning /proc"
+
+
+class Recycler:
+    """
+    Hands out the pages `process_each()` processes entries on. A page is replaced by a
+    fresh one after `max_navigations`, and the whole context (see
+    `BrowserWrapper.recycle_context()`) once the browser processes use more than
+    `memory_limit_mb`. Both only happen between entries: the context is replaced once every
+    page finished its current entry, while no new entry is started, and not before the
+    tasks passed to `defer_recycling()` are done.
+    """
+
+    def __init__(
+        self,
+        wrapper: "BrowserWrapper",
+        *,
+        max_navigations: int | None,
+        memory_limit_mb: int | None,
+    ):
+        self.wrapper = wrapper
+        self.max_navigations = max_navigations
+        self.memory_limit_mb = memory_limit_mb
+        self.pages_recycled = 0
+        self.contexts_recycled = 0
+        self._navigations = dict[Page, int]()
+        self._busy = 0
+        "Pages processing an entry"
+        self._draining = False
+        "Whether the context is about to be recycled, so no entry may start"
+        self._condition = asyncio.Condition()
+        self._checked_at = time.monotonic()
+        self._deferred_by = list[asyncio.Future[Any]]()
+
+    def defer_recycling(self, task: asyncio.Future[Any]) -> None:
+        """Keep the context until `task` is done, e.g. while `find()` still uses a page"""
+        self._deferred_by.append(task)
+
+    async def acquire(self, page: Page | None) -> Page:
+        """Return the page to process the next entry on: `page`, or its replacement"""
+        async with self._condition:
+            await self._condition.wait_for(lambda: not self._draining)
+            if self._over_memory():
+                self._draining = True
+                try:
+                    await self._condition.wait_for(lambda: self._busy == 0)
+                    await self._recycle_context()
+                finally:
+                    self._draining = False
+                    self._condition.notify_all()
+
+            if page is not None and (
+                page.is_closed() or page.context is not self.wrapper.context
+            ):
+                page = None
+            if (
+                page is not None
+                and self.max_navigations is not None
+                and self._navigations.get(page, 0) >= self.max_navigations
+            ):
+                # Opened first, so the context never runs out of pages and closes
+                fresh = await self._new_page()
+                await page.close()
+                page = fresh
+                self.pages_recycled += 1
+            elif page is None:
+                page = await self._new_page()
+            self._busy += 1
+            return page
+
+    async def release(self) -> None:
+        """Mark the entry processed on a page from `acquire()` as finished"""
+        async with self._condition:
+            self._busy -= 1
+            self._condition.notify_all()
+
+    async def _new_page(self) -> Page:
+        page = await self.wrapper.context.new_page()
+        self._navigations[page] = 0
+        page.on("framenavigated", self._on_navigated)
+        page.on("close", self._on_close)
+        return page
+
+    def _on_close(self, page: Page) -> None:
+        self._navigations.pop(page, None)
+
+    def _on_navigated(self, frame: Frame) -> None:
+        if frame.parent_frame is None and frame.page in self._navigations:
+            self._navigations[frame.page] += 1
+
+    def _over_memory(self) -> bool:
+        if self.memory_limit_mb is None:
+            return False
+        if not all(task.done() for task in self._deferred_by):
+            return False
+        if time.monotonic() - self._checked_at < MEMORY_CHECK_INTERVAL:
+            return False
+        self._checked_at = time.monotonic()
+        rss = self.wrapper.browser_rss_mb()
+        return rss is not None and rss > self.memory_limit_mb
+
+    async def _recycle_context(self) -> None:
+        before = self.wrapper.browser_rss_mb() or 0.0
+        await self.wrapper.recycle_context()
+        self.contexts_recycled += 1
+        after = self.wrapper.browser_rss_mb() or 0.0
+        print(f"Recycled the browser context at {before:.0f} MB, now using {after:.0f} MB")
+        if self.memory_limit_mb is not None and after > self.memory_limit_mb:
+            # The memory isn't ours to free (e.g. other procedures share the browser), so
+            # recycling again would only slow this run down
+            print("Still over the browser memory limit, not recycling the context again")
+            self.memory_limit_mb = None
@@ -0,0 +1,60 @@
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+
+
+class RunHistory:
+    """Remembers when procedures last ran on schedule, and their landing page fingerprints"""
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        with self._db:
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS runs (
+                    procedure TEXT PRIMARY KEY,
+                    started_at TEXT NOT NULL,
+                    error TEXT
+                )"""
+            )
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS fingerprints (
+                    procedure TEXT PRIMARY KEY,
+                    fingerprint TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                )"""
+            )
+
+    def last_run(self, procedure: str) -> datetime | None:
+        """When the last scheduled run of the procedure started, if it ever ran"""
+        row = self._db.execute(
+            "SELECT started_at FROM runs WHERE procedure = ?", (procedure,)
+        ).fetchone()
+        return datetime.fromisoformat(row[0]) if row else None
+
+    def record_run(self, procedure: str, started_at: datetime, error: str | None) -> None:
+        with self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO runs VALUES (?, ?, ?)",
+                (procedure, started_at.isoformat(), error),
+            )
+
+    def fingerprint(self, procedure: str) -> str | None:
+        """Fingerprint of the landing page the last time the procedure ran successfully"""
+        row = self._db.execute(
+            "SELECT fingerprint FROM fingerprints WHERE procedure = ?", (procedure,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def set_fingerprint(self, procedure: str, fingerprint: str) -> None:
+        with self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO fingerprints VALUES (?, ?, ?)",
+                (procedure, fingerprint, datetime.now().isoformat()),
+            )
+
+    def forget(self, procedure: str) -> None:
+        with self._db:
+            self._db.execute("DELETE FROM runs WHERE procedure = ?", (procedure,))
+            self._db.execute("DELETE FROM fingerprints WHERE procedure = ?", (procedure,))
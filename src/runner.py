@@ -0,0 +1,377 @@
+import asyncio
+import sys
+import time
+import traceback
+from dataclasses import dataclass
+from functools import partial
+from pathlib import Path
+
+from rich.console import Console
+from rich.table import Column, Table
+
+from .browser import BrowserWrapper
+from .env import Context, ProcedureInfo
+from .execution import EntryResult, FindError, iter_find, run_process
+from .fingerprint import FingerprintRecorder
+from .procedures import import_procedure
+from .ratelimit import RateLimiter
+from .store import MetadataStore
+from .tracing import Tracer, span
+from .workers import WorkerError
+
+
+@dataclass
+class RunResult:
+    name: str
+    elapsed: float
+    "Wall time in seconds"
+    entries: int | None = None
+    "Number of entries found by `find()`, None if it never started"
+    processed: int = 0
+    "Number of those entries that were new or had failed before"
+    failed: int = 0
+    "Number of entries `process_one()` failed on"
+    downloads: int = 0
+    "Number of new files downloaded"
+    blocked: int = 0
+    "Number of requests blocked by the procedure's resource policy"
+    trace: Path | None = None
+    "Where the timings of this run were exported (in Chrome's trace format)"
+    skipped: bool = False
+    "The landing page's fingerprint hadn't changed, so `find()` wasn't run"
+    error: str | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and not self.failed
+
+
+async def run_procedure(
+    ctx: Context,
+    proc: ProcedureInfo,
+    *,
+    headless: bool = True,
+    timeout: float | None = None,
+    reprocess: bool = False,
+    force: bool = False,
+    rate_limiter: RateLimiter | None = None,
+) -> RunResult:
+    """
+    Run `find()` then `process()` on the entries of a single procedure that are new or
+    failed last time (or every entry if `reprocess`). Unless `force`, nothing is run if the
+    procedure has a fingerprint and it is the same as after the last successful run.
+    """
+    with Tracer().activate() as tracer, span("procedure", name=proc.name):
+        result = await _run_procedure(
+            ctx,
+            proc,
+            headless=headless,
+            timeout=timeout,
+            reprocess=reprocess,
+            force=force,
+            rate_limiter=rate_limiter,
+        )
+    result.trace = ctx.new_trace_path(proc.name)
+    tracer.export(result.trace)
+    return result
+
+
+async def _run_procedure(
+    ctx: Context,
+    proc: ProcedureInfo,
+    *,
+    headless: bool,
+    timeout: float | None,
+    reprocess: bool,
+    force: bool,
+    rate_limiter: RateLimiter | None,
+) -> RunResult:
+    start = time.perf_counter()
+    result = RunResult(proc.name, elapsed=0)
+    try:
+        # Covers loading the landing page too: the browser waits forever by default
+        if ctx.isolated_execution:
+            run = _run_isolated(
+                ctx,
+                proc,
+                result,
+                headless=headless,
+                reprocess=reprocess,
+                force=force,
+                rate_limiter=rate_limiter,
+            )
+        else:
+            run = _run_in_process(
+                ctx,
+                proc,
+                result,
+                headless=headless,
+                reprocess=reprocess,
+                force=force,
+                rate_limiter=rate_limiter,
+            )
+        await asyncio.wait_for(run, timeout=timeout)
+    except asyncio.TimeoutError:
+        result.error = f"Timed out after {timeout}s"
+    except Exception as e:
+        traceback.print_exc()
+        result.error = f"{e.__class__.__name__}: {e}"
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+async def _run_in_process(
+    ctx: Context,
+    proc: ProcedureInfo,
+    result: RunResult,
+    *,
+    headless: bool,
+    reprocess: bool,
+    force: bool,
+    rate_limiter: RateLimiter | None,
+) -> None:
+    module = import_procedure(ctx, proc.name)
+    wrapper = await BrowserWrapper.init(
+        ctx=ctx, proc=proc, initial_url=None, headless=headless, rate_limiter=rate_limiter
+    )
+    try:
+        fingerprint = await _load_landing_page(wrapper, proc)
+        if not force and _unchanged(ctx, proc, fingerprint):
+            result.skipped = True
+            return
+        result.entries = 0
+        outcomes = {} if reprocess else ctx.entry_index.outcomes(proc.name)
+
+        async def _pending_entries():
+            """Entries as they are found, so `process_one()` can start on them early"""
+            assert result.entries is not None
+            async for entry in iter_find(module, wrapper.page):
+                result.entries += 1
+                # New entries, and ones that failed last time
+                if outcomes.get(entry.id, "") is not None:
+                    result.processed += 1
+                    yield entry
+
+        try:
+            processed = await run_process(
+                wrapper, module, _pending_entries(), on_result=partial(_record, ctx, proc)
+            )
+        except FindError as e:
+            traceback.print_exc()
+            result.error = f"find() failed: {e}"
+            processed = e.results
+        result.failed = sum(not entry.ok for entry in processed)
+        if fingerprint is not None and result.ok:
+            ctx.run_history.set_fingerprint(proc.name, fingerprint)
+        await wrapper.downloads.wait()
+        result.downloads = len(wrapper.downloads.saved)
+        result.blocked = sum(wrapper.blocker.blocked.values())
+    finally:
+        await wrapper.close()
+
+
+async def _load_landing_page(wrapper: BrowserWrapper, proc: ProcedureInfo) -> str | None:
+    """Open the procedure's initial url, returning its fingerprint if the procedure has one"""
+    if proc.fingerprint is None:
+        await wrapper.goto(proc.initial_url)
+        return None
+    recorder = FingerprintRecorder(proc.fingerprint)
+    recorder.attach(wrapper.page)
+    await wrapper.goto(proc.initial_url)
+    return await recorder.compute(wrapper.page)
+
+
+def _record(ctx: Context, proc: ProcedureInfo, entry: EntryResult) -> None:
+    """Record an entry as soon as it's processed, so it's done even if the run is cut short"""
+    ctx.entry_index.record(proc.name, [entry])
+
+
+def _unchanged(ctx: Context, proc: ProcedureInfo, fingerprint: str | None) -> bool:
+    if fingerprint is None or fingerprint != ctx.run_history.fingerprint(proc.name):
+        return False
+    print(f"{proc.name}: the landing page hasn't changed since the last run, skipping it")
+    return True
+
+
+async def _run_isolated(
+    ctx: Context,
+    proc: ProcedureInfo,
+    result: RunResult,
+    *,
+    headless: bool,
+    reprocess: bool,
+    force: bool,
+    rate_limiter: RateLimiter | None,
+) -> None:
+    """
+    Like `_run_in_process()`, but in worker processes, each job also limited by the config's
+    timeout. The workers' requests aren't limited by `rate_limiter`, only the fingerprint's.
+    """
+    workers = ctx.worker_pool
+    fingerprint = None
+    try:
+        if proc.fingerprint is not None:
+            # No procedure code runs here, so this is safe to do outside of the workers
+            wrapper = await BrowserWrapper.init(
+                ctx=ctx,
+                proc=proc,
+                initial_url=None,
+                headless=headless,
+                rate_limiter=rate_limiter,
+            )
+            try:
+                fingerprint = await _load_landing_page(wrapper, proc)
+            finally:
+                await wrapper.close()
+            if not force and _unchanged(ctx, proc, fingerprint):
+                result.skipped = True
+                return
+        found = await workers.find(proc, url=proc.initial_url, headless=headless)
+        entries = found.entries or []
+        result.entries = len(entries)
+        if not reprocess:
+            pending = ctx.entry_index.pending(proc.name, (e.id for e in entries))
+            entries = [entry for entry in entries if entry.id in pending]
+        result.processed = len(entries)
+        processed = await workers.process(
+            proc,
+            entries,
+            url=proc.initial_url,
+            headless=headless,
+            on_result=partial(_record, ctx, proc),
+        )
+        result.failed = sum(not entry.ok for entry in processed.results or [])
+        result.downloads = processed.downloads
+        result.blocked = found.blocked + processed.blocked
+        if fingerprint is not None and result.ok:
+            ctx.run_history.set_fingerprint(proc.name, fingerprint)
+    except WorkerError as e:
+        print(e, file=sys.stderr)
+        result.error = str(e).strip().splitlines()[-1]
+    except Exception as e:
+        traceback.print_exc()
+        result.error = f"{e.__class__.__name__}: {e}"
+
+
+async def run_procedures(
+    ctx: Context,
+    procs: list[ProcedureInfo],
+    *,
+    concurrency: int,
+    headless: bool = True,
+    timeout: float | None = None,
+    reprocess: bool = False,
+    force: bool = False,
+) -> list[RunResult]:
+    """
+    Run procedures concurrently, with at most `concurrency` running at once. They all share
+    one browser from `ctx.browser_pool`, each in its own context.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def _run(proc: ProcedureInfo) -> RunResult:
+        async with semaphore:
+            return await run_procedure(
+                ctx,
+                proc,
+                headless=headless,
+                timeout=timeout,
+                reprocess=reprocess,
+                force=force,
+            )
+
+    try:
+        return await asyncio.gather(*(_run(proc) for proc in procs))
+    finally:
+        await ctx.close()
+
+
+def load_procedures(names: list[str] | None) -> tuple[Context, list[ProcedureInfo]] | None:
+    """
+    Load the config and the named procedures, or every procedure with a file if `names` is
+    None. Print the unknown names and return None if there are any.
+    """
+    store = MetadataStore(Context.store_p)
+    ctx = Context(store.load(import_from=Context.config_p), store)
+    if names is None:
+        return ctx, [proc for proc in ctx.all_procedures.values() if proc.exists(ctx)]
+    if missing := [name for name in names if name not in ctx.all_procedures]:
+        Console(stderr=True).print(f"Unknown procedure(s): {', '.join(missing)}")
+        return None
+    return ctx, [ctx.all_procedures[name] for name in names]
+
+
+def results_table(title: str, *columns: str | Column) -> Table:
+    """
+    A table with a row per procedure: its name, status, `columns` and wall time. Rows are
+    added with `add_result_row()`.
+    """
+    return Table(
+        "Procedure", "Status", *columns, Column("Wall time", justify="right"), title=title
+    )
+
+
+def add_result_row(table: Table, name: str, status: str, *cells: str, elapsed: float) -> None:
+    table.add_row(name, status, *cells, f"{elapsed:.2f}s")
+
+
+def print_report(results: list[RunResult], elapsed: float) -> None:
+    table = results_table(
+        f"Ran {len(results)} procedure(s) in {elapsed:.2f}s",
+        Column("Processed/Found", justify="right"),
+        Column("Downloads", justify="right"),
+        Column("Blocked", justify="right"),
+    )
+    for result in results:
+        if result.error:
+            status = f"[red]FAILED[/] {result.error}"
+        elif result.failed:
+            status = f"[red]FAILED[/] {result.failed} entries failed"
+        elif result.skipped:
+            status = "[green]UNCHANGED[/]"
+        else:
+            status = "[green]OK[/]"
+        entries = "-" if result.entries is None else f"{result.processed}/{result.entries}"
+        add_result_row(
+            table,
+            result.name,
+            status,
+            entries,
+            str(result.downloads),
+            str(result.blocked),
+            elapsed=result.elapsed,
+        )
+    if traces := [result.trace for result in results if result.trace]:
+        table.caption = f"Traces (Chrome trace format) are in {traces[0].parent.parent}"
+    Console().print(table)
+
+
+def run(
+    names: list[str] | None,
+    *,
+    concurrency: int,
+    headless: bool = True,
+    timeout: float | None = None,
+    reprocess: bool = False,
+    force: bool = False,
+) -> int:
+    """Run the named procedures (all of them if `names` is None) and return an exit code"""
+    if (loaded := load_procedures(names)) is None:
+        return 2
+    ctx, procs = loaded
+    ctx.prune_snapshots(proc.name for proc in procs)
+
+    start = time.perf_counter()
+    results = asyncio.run(
+        run_procedures(
+            ctx,
+            procs,
+            concurrency=concurrency,
+            headless=headless,
+            timeout=timeout,
+            reprocess=reprocess,
+            force=force,
+        )
+    )
+    print_report(results, time.perf_counter() - start)
+    return 0 if all(result.ok for result in results) else 1
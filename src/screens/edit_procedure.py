@@ -1,32 +1,36 @@
 import asyncio
-import importlib
 import sys
 import traceback
 from contextlib import contextmanager, redirect_stderr, redirect_stdout
 from copy import deepcopy
 from datetime import datetime
-from io import StringIO
 from pathlib import Path
-from typing import Any
+from types import ModuleType, SimpleNamespace
+from typing import Any, Iterator, TextIO, cast
 
-from rich.markup import escape
+from rich.text import Text
 from textual import on, work
 from textual.app import ComposeResult
 from textual.containers import ScrollableContainer
 from textual.screen import Screen
 from textual.widget import Widget
-from textual.widgets import Button, OptionList, SelectionList, Static
+from textual.widgets import Button, Input, OptionList, Static, TextLog
 from textual.widgets.option_list import Option
-from textual.widgets.selection_list import Selection
 
 from ..browser import BrowserWrapper
+from ..entry_store import EntryStore
 from ..env import Context, ProcedureInfo, Snapshot
+from ..execution import EntryResult, batched, iter_find, run_process
+from ..find_cache import CachedFind, cacheable, snapshot_key, source_hash
+from ..logs import MAX_LINES, RunLog
+from ..procedures import import_procedure
+from ..tracing import Tracer
 from ..widgets.editor import Editor
+from ..widgets.entry_list import EntryList
+from ..workers import WorkerError, WorkerResult, entry_fields
 
 
 class EditProcedure(Screen[ProcedureInfo]):
-    _entries: dict[str, Any] = {}
-
     def __init__(
         self,
         ctx: Context,
@@ -38,7 +42,8 @@ class EditProcedure(Screen[ProcedureInfo]):
         super().__init__(name, id, classes)
         self.proc = deepcopy(proc)
         self.ctx = ctx
-        # TODO: More robust yet still consistent filename
+        self.entries = EntryStore()
+        # Recordings are only written here until they are moved into the snapshot store
         self.snapshot_dir = Path(f"/tmp/state_dl/{proc.name}")
         self.snapshot_dir.mkdir(parents=True, exist_ok=True)
 
@@ -53,7 +58,7 @@ class EditProcedure(Screen[ProcedureInfo]):
 
     @property
     def initial_url(self):
-        return self.proc.snapshots[0].uri if self.proc.snapshots else "https://example.com"
+        return self.proc.initial_url
 
     def compose(self) -> ComposeResult:
         with ScrollableContainer(id="editor"):
@@ -70,76 +75,135 @@ class EditProcedure(Screen[ProcedureInfo]):
             with Widget(classes="button-row"):
                 yield Button("Run `find()`", id="find")
                 yield Button("Run `process()`", id="process")
+                yield Button("Clear cached `find()`", id="clear-find-cache")
                 yield Static(classes="button-row-spacing")
                 yield Button("Live snapshot", id="snapshot-live")
                 yield Button("Static snapshot", id="snapshot-static")
+                yield Button("Recorded snapshot", id="snapshot-recorded")
                 yield Static(classes="button-row-spacing")
                 yield Button("Save procedure", id="save")
                 yield Static(classes="button-row-spacing")
                 yield Button("Toggle Entry selection", id="toggle-entries")
+                yield Button("Hide processed", id="toggle-processed")
             self.name_label = Static(self.procedure_file.stem)
             yield self.name_label
-            self.options = SelectionList[str]()
-            self.options.border_title = "Entries"
-            yield self.options
-        with ScrollableContainer(id="debug_output") as container:
-            container.border_title = "Debug Output (stdout/stderr)"
-            self.output = Static()
-            yield self.output
+            yield Input(placeholder="Filter entries", id="entry_filter")
+            self.entry_list = EntryList(self.entries)
+            self.entry_list.border_title = "Entries"
+            yield self.entry_list
+        self.output = TextLog(id="debug_output", max_lines=MAX_LINES, markup=False)
+        self.output.border_title = "Debug Output (stdout/stderr)"
+        yield self.output
 
     def on_mount(self) -> None:
         for snap in self.proc.snapshots:
-            self.snapshot_list.add_option(Option(f"[i]{snap.time}[/] [b]{snap.uri}[/]"))
+            self._add_snapshot_option(snap)
+        self._restore_latest_find()
+        self._warm_browser()
+
+    def _add_snapshot_option(self, snap: Snapshot):
+        label = f"[i]{snap.time}[/] [b]{snap.uri}[/]"
+        if snap.recorded:
+            label += " (recorded)"
+        self.snapshot_list.add_option(Option(label))
+
+    def _store_snapshot(self, snap: Snapshot) -> None:
+        """Add a snapshot whose blobs were just stored, evicting old ones if necessary"""
+        self.proc.snapshots.append(snap)
+        if evicted := self.ctx.evict_snapshots(keep=snap.blobs):
+            self.proc.snapshots = [s for s in self.proc.snapshots if not s.blobs & evicted]
+            self.snapshot_list.clear_options()
+            for s in self.proc.snapshots:
+                self._add_snapshot_option(s)
+            self.notify(f"Evicted {len(evicted)} old snapshot(s) to stay under the size limit")
+        else:
+            self._add_snapshot_option(snap)
+
+    @work
+    async def _warm_browser(self):
+        """Launch the browser in the background so the first find() only creates a context"""
+        await self.ctx.browser_pool.warm()
 
     @on(OptionList.OptionSelected, "#snapshot_list")
     async def snapshot_list_selected(self, selected: OptionList.OptionSelected) -> None:
+        snap = self.proc.snapshots[selected.option_index]
+        if cached := self._cached_find(snap):
+            self._show_cached_find(cached)
         self.snapshot_list.disabled = True
-        self._browser_goto(self.proc.snapshots[selected.option_index].uri)
+        self._browser_goto(snap)
 
     @work
-    async def _browser_goto(self, uri: str):
+    async def _browser_goto(self, snap: Snapshot):
         """
         Wrapped in a worker since launching a browser the
         first time can exceed a message-handler timeout
         """
-        await self.get_browser(uri)
+        self._snapshot = snap
+        await self.get_browser(snap)
         self.snapshot_list.disabled = False
 
-    # TODO: Move browser to .env.Context()
+    _snapshot: Snapshot | None = None
+    "The last selected snapshot, which isolated runs start from if it has recorded traffic"
+
+    # The browser itself is kept warm by `self.ctx.browser_pool`, this is just our context
     _browser: BrowserWrapper | None = None
 
-    async def get_browser(self, url: str | None = None) -> BrowserWrapper:
-        if self._browser is not None:
-            if url:
-                await self._browser.page.goto(url)
-            return self._browser
-        # TODO: Have run_find() and run_process() call proc_module.init() to goto(initial_url)
-        self._browser = await BrowserWrapper.init(
-            ctx=self.ctx,
-            initial_url=url or self.initial_url,
-            on_close=self._clear_browser,
-        )
+    async def get_browser(self, snapshot: Snapshot | None = None) -> BrowserWrapper:
+        if self._browser is None:
+            # TODO: Have run_find() and run_process() call proc_module.init() to
+            #  goto(initial_url)
+            self._browser = await BrowserWrapper.init(
+                ctx=self.ctx,
+                proc=self.proc,
+                initial_url=None if snapshot else self.initial_url,
+                on_close=self._clear_browser,
+            )
+        if snapshot:
+            await self._browser.goto_snapshot(snapshot)
         return self._browser
 
     async def _clear_browser(self):
         assert self._browser
         self._browser = None
 
+    @contextmanager
+    def _capture_output(self) -> Iterator[RunLog]:
+        """Stream stdout/stderr into the debug pane as it's written, and into this run's log"""
+        self.output.clear()
+        log = RunLog(self.ctx.new_log_path(self.proc.name), on_line=self.output.write)
+        try:
+            stream = cast(TextIO, log)
+            with redirect_stdout(stream), redirect_stderr(stream):
+                yield log
+        finally:
+            log.close()
+            self._last_log = log
+
+    _last_log: RunLog | None = None
+
+    @contextmanager
+    def _trace(self) -> Iterator[Tracer]:
+        """Time the phases of a run, then print a summary and export the trace"""
+        tracer = Tracer()
+        try:
+            with tracer.activate():
+                yield tracer
+        finally:
+            if tracer.spans:
+                path = self.ctx.new_trace_path(self.proc.name)
+                tracer.export(path)
+                print("Timings:")
+                for line in tracer.summary():
+                    print(f"  {line}")
+                print(f"Trace saved to {path}")
+
     @contextmanager
     def _import_procedure(self):
-        output = StringIO()
-        with redirect_stdout(output), redirect_stderr(output):
+        with self._capture_output(), self._trace():
             # TODO: Timeout to catch infinite loops
-            module_name = self.procedure_file.stem
-            package = self.ctx.procedures_dir_p.stem
-            module = sys.modules.get(module_name)
-
             imported = False
             try:
-                if not module:
-                    module = importlib.import_module(name=module_name, package=package)
-                else:
-                    module = importlib.reload(module)
+                module = import_procedure(self.ctx, self.procedure_file.stem)
                 imported = True
                 yield module
             except Exception:
@@ -147,9 +211,6 @@ class EditProcedure(Screen[ProcedureInfo]):
                 if not imported:
                     yield None
 
-        output.seek(0)
-        self.output.update(escape(output.read()))
-
     @contextmanager
     def _set_status(self, status: str, end_status: str | None = None):
         self.name_label.update(f"{self.procedure_file.stem} <{status}>")
@@ -162,10 +223,19 @@ class EditProcedure(Screen[ProcedureInfo]):
 
     @on(Button.Pressed, "#toggle-entries")
     async def toggle_entries(self):
-        if len(self.options.selected) < self.options.option_count:
-            self.options.select_all()
+        if self.entries.selected.count(1) < len(self.entries):
+            self.entry_list.action_select_all()
         else:
-            self.options.deselect_all()
+            self.entry_list.action_select_none()
+
+    @on(Input.Changed, "#entry_filter")
+    def filter_entries(self, event: Input.Changed):
+        self.entry_list.set_filter(event.value)
+        self._update_entry_count()
+
+    def _update_entry_count(self):
+        shown, total = self.entry_list.shown, len(self.entries)
+        self.entry_list.border_subtitle = f"{shown}/{total}" if shown < total else str(total)
 
     @on(Button.Pressed, "#find")
     async def run_find(self):
@@ -173,40 +243,178 @@ class EditProcedure(Screen[ProcedureInfo]):
 
     @work
     async def _run_find(self):
-        with self._import_procedure() as module, self._set_status(
-            "PENDING", end_status="find() FINISHED"
-        ):
-            if not module:
-                return
-            wrapper = await self.get_browser()
+        # Runs on a static or recorded snapshot always find the same entries, so they are
+        # cached until the procedure changes
+        snapshot = self._snapshot if cacheable(self._snapshot) else None
+        if snapshot is not None and (cached := self._cached_find(snapshot)):
+            self._show_cached_find(cached)
+            return
+        source = source_hash(self.procedure_file.read_bytes())
+        found = False
 
-            self.options.clear_options()
-            try:
-                entries = await asyncio.wait_for(module.find(wrapper.page), timeout=30)
-            except asyncio.TimeoutError:
-                return
+        if self.ctx.isolated_execution:
+            with self._capture_output(), self._trace(), self._set_status(
+                "PENDING", "find() FINISHED"
+            ):
+                self._clear_entries()
+                found = await self._run_isolated("find", snapshot=snapshot) is not None
+        else:
+            with self._import_procedure() as module, self._set_status(
+                "PENDING", end_status="find() FINISHED"
+            ):
+                if not module:
+                    return
+                # Start from the snapshot again, the last find() may have navigated away
+                wrapper = await self.get_browser(snapshot)
 
-            assert isinstance(entries, list), "expected `find()` to return list[Entry]"
-            self._entries = {e.id: e for e in entries}
-            self.options.add_options(
-                [
-                    Selection(
-                        entry.label,
-                        entry.id,
-                        initial_state=not index,
+                self._clear_entries()
+                try:
+                    await asyncio.wait_for(self._stream_entries(module, wrapper), timeout=30)
+                    found = True
+                except asyncio.TimeoutError:
+                    print(
+                        f"find() timed out, keeping the {len(self.entries)} entries"
+                        " found so far"
                     )
-                    for index, entry in enumerate(entries)
-                ]
+                finally:
+                    if wrapper.blocker.policy:
+                        print(wrapper.blocker.summary())
+
+        if found and snapshot is not None and self._last_log is not None:
+            self.ctx.find_cache.put(
+                self.proc.name,
+                source,
+                snapshot,
+                [entry_fields(entry) for entry in self.entries],
+                "\n".join(self._last_log.lines),
             )
 
+    def _cached_find(self, snapshot: Snapshot) -> CachedFind | None:
+        if not cacheable(snapshot):
+            return None
+        source = source_hash(self.procedure_file.read_bytes())
+        return self.ctx.find_cache.get(self.proc.name, source, snapshot)
+
+    def _restore_latest_find(self):
+        """Show the last entries found by this version of the procedure, if still valid"""
+        source = source_hash(self.procedure_file.read_bytes())
+        if not (cached := self.ctx.find_cache.latest(self.proc.name, source)):
+            return
+        key = snapshot_key(cached.snapshot)
+        for index, snap in enumerate(self.proc.snapshots):
+            if snapshot_key(snap) == key:
+                self._snapshot = snap
+                self.snapshot_list.highlighted = index
+                self._show_cached_find(cached)
+                return
+
+    def _show_cached_find(self, cached: CachedFind):
+        self.output.clear()
+        for line in cached.output.splitlines():
+            self.output.write(line)
+        self.output.write(
+            f"Restored {len(cached.entries)} entries found at {cached.found_at:%Y-%m-%d %H:%M}"
+            " (neither the procedure nor the snapshot changed since)"
+        )
+        self._clear_entries()
+        self._add_entries([SimpleNamespace(**fields) for fields in cached.entries])
+        self.name_label.update(f"{self.procedure_file.stem} <find() CACHED>")
+
+    @on(Button.Pressed, "#clear-find-cache")
+    def clear_find_cache(self):
+        count = self.ctx.find_cache.invalidate(self.proc.name)
+        self.notify(f"Forgot {count} cached find() result(s)")
+
+    async def _stream_entries(self, module: ModuleType, wrapper: BrowserWrapper):
+        async for batch in batched(iter_find(module, wrapper.page)):
+            self._add_entries(batch)
+
+    def _clear_entries(self):
+        self.entries.clear()
+        self._outcomes = self.ctx.entry_index.outcomes(self.proc.name)
+        self.entry_list.refresh_view()
+        self._update_entry_count()
+
+    _outcomes: dict[str, str | None] = {}
+    "Outcomes from the entry index, loaded once per find()"
+
+    def _add_entries(self, entries: list[Any]):
+        """Append newly found entries to the list, pre-selecting new and failed ones"""
+        if self.entries.add(entries, self._outcomes):
+            self.entry_list.refresh_view()
+            self._update_entry_count()
+
+    @on(Button.Pressed, "#toggle-processed")
+    def toggle_processed(self, event: Button.Pressed):
+        hide = self.entry_list.hide_processed = not self.entry_list.hide_processed
+        event.button.label = "Show processed" if hide else "Hide processed"
+        self.entry_list.refresh_view()
+        self._update_entry_count()
+
+    def _refresh_outcomes(self):
+        """Mark (or hide) entries that were processed since the list was filled"""
+        self._outcomes = self.ctx.entry_index.outcomes(self.proc.name)
+        self.entries.set_outcomes(self._outcomes)
+        self.entry_list.refresh_view()
+        self._update_entry_count()
+
+    async def _run_isolated(
+        self, kind: str, entries: list[Any] | None = None, *, snapshot: Snapshot | None = None
+    ) -> WorkerResult | None:
+        """
+        Run find() or process() in a worker process, streaming its output to stdout. The
+        worker starts from `snapshot`, or else the current page (or the selected recorded
+        snapshot).
+        """
+        on_output = sys.stdout.write
+        url = self._browser.page.url if self._browser else self.initial_url
+        if snapshot is None and self._snapshot and self._snapshot.recorded:
+            snapshot = self._snapshot
+        workers = self.ctx.worker_pool
+        try:
+            if kind == "find":
+                return await workers.find(
+                    self.proc,
+                    url=url,
+                    snapshot=snapshot,
+                    on_output=on_output,
+                    on_entries=self._add_entries,
+                )
+            return await workers.process(
+                self.proc, entries or [], url=url, snapshot=snapshot, on_output=on_output
+            )
+        except WorkerError as e:
+            print(e)
+            return None
+
+    def _report_results(self, results: list[EntryResult]):
+        self.ctx.entry_index.record(self.proc.name, results)
+        self._refresh_outcomes()
+        if failed := [result for result in results if not result.ok]:
+            print(f"{len(failed)}/{len(results)} entries failed:")
+            for result in failed:
+                print(f"  {result.id}: {result.error}")
+
     @on(Button.Pressed, "#process")
     async def run_process(self):
         self._run_process()
 
     @work
     async def _run_process(self):
-        if not self._entries:
-            self.output.update("Run [bold]find()[/] first, and ensure something's returned")
+        if not len(self.entries):
+            self.output.write(
+                Text.from_markup("Run [bold]find()[/] first, and ensure something's returned")
+            )
+            return
+
+        if self.ctx.isolated_execution:
+            with self._capture_output(), self._trace(), self._set_status(
+                "PENDING", "FINISHED"
+            ):
+                entries = self.entries.selected_entries()
+                if result := await self._run_isolated("process", entries):
+                    self._report_results(result.results or [])
+                    print(f"Saved {result.downloads} download(s)")
             return
 
         with self._import_procedure() as module, self._set_status("PENDING", "FINISHED"):
@@ -214,13 +422,27 @@ class EditProcedure(Screen[ProcedureInfo]):
                 return
             wrapper = await self.get_browser()
 
-            entries = [self._entries[id] for id in self.options.selected]
-            await module.process(wrapper.page, entries)
+            entries = [
+                # Restored from the find() cache or found by a worker
+                module.Entry(**vars(entry)) if isinstance(entry, SimpleNamespace) else entry
+                for entry in self.entries.selected_entries()
+            ]
+            downloads = wrapper.downloads
+            saved, skipped = len(downloads.saved), len(downloads.skipped)
+            self._report_results(await run_process(wrapper, module, entries))
+
+            await downloads.wait()
+            saved, skipped = len(downloads.saved) - saved, len(downloads.skipped) - skipped
+            if saved or skipped:
+                print(f"Saved {saved} download(s) to {downloads.output_dir}", end="")
+                print(f", skipped {skipped} already downloaded" if skipped else "")
+            if wrapper.blocker.policy:
+                print(wrapper.blocker.summary())
 
     @on(Button.Pressed, "#save")
     async def save_procedure(self):
         if self._browser:
-            await self._browser.context.close()
+            await self._browser.close()
             assert self._browser is None, "self._clear_browser callback should have run"
         self.dismiss(self.proc)
 
@@ -229,15 +451,27 @@ class EditProcedure(Screen[ProcedureInfo]):
         browser = await self.get_browser()
         snap = Snapshot(uri=browser.page.url)
         self.proc.snapshots.append(snap)
-        self.snapshot_list.add_option(Option(f"[i]{snap.time}[/] [b]{snap.uri}[/]"))
+        self._add_snapshot_option(snap)
 
     @on(Button.Pressed, "#snapshot-static")
     async def snapshot_static(self):
         browser = await self.get_browser()
         content = await browser.page.content()
-        now = datetime.now()
-        path = self.snapshot_dir / f"{now}.html"
-        path.write_text(content)
-        snap = Snapshot(uri=f"file://{path}", time=now)
-        self.proc.snapshots.append(snap)
-        self.snapshot_list.add_option(Option(f"[i]{snap.time}[/] [b]{snap.uri}[/]"))
+        digest = self.ctx.snapshot_store.put(content.encode())
+        self._store_snapshot(Snapshot(uri=f"snapshot://{digest}", url=browser.page.url))
+
+    @on(Button.Pressed, "#snapshot-recorded")
+    async def snapshot_recorded(self):
+        self._snapshot_recorded()
+
+    @work
+    async def _snapshot_recorded(self):
+        """Reload the current page while recording all of its network traffic"""
+        with self._set_status("RECORDING"):
+            browser = await self.get_browser()
+            now = datetime.now()
+            path = self.snapshot_dir / f"{now}.har"
+            await browser.record_har(browser.page.url, path)
+            digest = self.ctx.snapshot_store.put(path.read_bytes())
+            path.unlink()
+        self._store_snapshot(Snapshot(uri=browser.page.url, time=now, har_blob=digest))
@@ -0,0 +1,124 @@
+import asyncio
+import time
+import traceback
+from dataclasses import dataclass
+
+from rich.console import Console
+
+from .browser import BrowserWrapper
+from .env import Context, ProcedureInfo, Snapshot
+from .runner import add_result_row, load_procedures, results_table
+from .snapshot_store import SCHEME
+from .tracing import span
+
+
+@dataclass
+class RefreshResult:
+    name: str
+    elapsed: float
+    "Wall time in seconds"
+    snapshot: Snapshot | None = None
+    error: str | None = None
+
+
+def live_url(proc: ProcedureInfo) -> str | None:
+    """The first url among the procedure's snapshots (static ones know where they are from)"""
+    for snap in proc.snapshots:
+        if url := snap.live_url:
+            return url
+    return None
+
+
+async def take_snapshot(
+    ctx: Context, proc: ProcedureInfo, *, headless: bool = True, timeout: float | None = None
+) -> RefreshResult:
+    """Load the procedure's live url in its own context and save a static snapshot of it"""
+    start = time.perf_counter()
+    result = RefreshResult(proc.name, 0)
+    if (url := live_url(proc)) is None:
+        result.error = "None of its snapshots has a url"
+        return result
+
+    async def _take() -> Snapshot:
+        wrapper = await BrowserWrapper.init(
+            ctx=ctx, proc=proc, initial_url=url, headless=headless
+        )
+        try:
+            with span("snapshot", procedure=proc.name):
+                content = await wrapper.page.content()
+            digest = ctx.snapshot_store.put(content.encode())
+            return Snapshot(uri=f"{SCHEME}{digest}", url=wrapper.page.url)
+        finally:
+            await wrapper.close()
+
+    try:
+        result.snapshot = await asyncio.wait_for(_take(), timeout)
+    except asyncio.TimeoutError:
+        result.error = f"Timed out after {timeout}s"
+    except Exception as e:
+        traceback.print_exc()
+        result.error = f"{e.__class__.__name__}: {e}"
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+async def refresh_snapshots(
+    ctx: Context,
+    procs: list[ProcedureInfo],
+    *,
+    concurrency: int,
+    headless: bool = True,
+    timeout: float | None = None,
+) -> list[RefreshResult]:
+    """
+    Take a static snapshot of every procedure's live url, with at most `concurrency` pages
+    loading at once, then add them to the procedures in the store in one transaction
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def _take(proc: ProcedureInfo) -> RefreshResult:
+        async with semaphore:
+            return await take_snapshot(ctx, proc, headless=headless, timeout=timeout)
+
+    try:
+        results = await asyncio.gather(*(_take(proc) for proc in procs))
+    finally:
+        await ctx.close()
+
+    taken = {result.name: result.snapshot for result in results if result.snapshot}
+    ctx.store.add_snapshots_of({name: [snap] for name, snap in taken.items()})
+    blobs = {digest for snap in taken.values() for digest in snap.blobs}
+    if evicted := ctx.evict_snapshots(keep=blobs):
+        print(f"Evicted {len(evicted)} old snapshot(s) to stay under the size limit")
+    return results
+
+
+def print_report(results: list[RefreshResult], elapsed: float) -> None:
+    table = results_table(f"Took {len(results)} snapshot(s) in {elapsed:.2f}s", "Url")
+    for result in results:
+        status = f"[red]FAILED[/] {result.error}" if result.error else "[green]OK[/]"
+        url = result.snapshot.url if result.snapshot else None
+        add_result_row(table, result.name, status, url or "", elapsed=result.elapsed)
+    Console().print(table)
+
+
+def run(
+    names: list[str] | None,
+    *,
+    concurrency: int,
+    headless: bool = True,
+    timeout: float | None = None,
+) -> int:
+    """Snapshot the named procedures (all of them if `names` is None), return an exit code"""
+    if (loaded := load_procedures(names)) is None:
+        return 2
+    ctx, procs = loaded
+
+    start = time.perf_counter()
+    results = asyncio.run(
+        refresh_snapshots(
+            ctx, procs, concurrency=concurrency, headless=headless, timeout=timeout
+        )
+    )
+    print_report(results, time.perf_counter() - start)
+    return 0 if all(result.error is None for result in results) else 1
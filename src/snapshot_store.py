@@ -0,0 +1,99 @@
+import gzip
+import hashlib
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable
+
+if TYPE_CHECKING:
+    from .env import Snapshot
+    from .store import MetadataStore
+
+SCHEME = "snapshot://"
+CACHE_MAX_AGE = 24 * 60 * 60
+"Seconds after which an unused decompressed copy of a blob is deleted"
+
+
+class SnapshotStore:
+    """
+    Compressed, content-addressed storage for snapshot pages and recorded traffic. Identical
+    captures are stored once, and the least recently used blobs are evicted (together with
+    the snapshots that use them) once the store grows past `max_bytes`.
+    """
+
+    def __init__(self, directory: Path, store: "MetadataStore", max_bytes: int | None):
+        self.directory = directory
+        self.store = store
+        self.max_bytes = max_bytes
+        self._cache_dir = Path(tempfile.gettempdir()) / "state_dl" / "snapshots"
+        "Decompressed copies of blobs, for Playwright to load"
+
+    def _path(self, digest: str) -> Path:
+        return self.directory / digest[:2] / f"{digest}.gz"
+
+    def put(self, data: bytes) -> str:
+        """Store `data` (unless it already is) and return its digest"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(".part")
+            tmp.write_bytes(gzip.compress(data, compresslevel=6))
+            os.replace(tmp, path)
+        self.store.add_blob(digest, path.stat().st_size)
+        return digest
+
+    def has(self, digest: str) -> bool:
+        return self._path(digest).exists()
+
+    def open(self, digest: str, suffix: str) -> Path:
+        """Return the path of a decompressed copy of the blob"""
+        path = self._cache_dir / f"{digest}{suffix}"
+        if path.exists():
+            os.utime(path)  # So it isn't pruned while in use
+        else:
+            self._prune_cache()
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(".part")
+            tmp.write_bytes(gzip.decompress(self._path(digest).read_bytes()))
+            os.replace(tmp, path)
+        self.store.touch_blob(digest)
+        return path
+
+    def _prune_cache(self) -> None:
+        """Delete the decompressed copies that weren't opened for `CACHE_MAX_AGE`"""
+        stale = time.time() - CACHE_MAX_AGE
+        for path in self._cache_dir.glob("*"):
+            try:
+                if path.stat().st_mtime < stale:
+                    path.unlink()
+            except OSError:
+                pass  # Deleted by another process in the meantime
+
+    def resolve_uri(self, uri: str) -> str:
+        """Turn a `snapshot://` uri into a `file://` uri the browser can load"""
+        if uri.startswith(SCHEME):
+            return self.open(uri.removeprefix(SCHEME), ".html").as_uri()
+        return uri
+
+    def resolve(self, snap: "Snapshot") -> "Snapshot":
+        """Return a copy of `snap` that only refers to files the browser can load"""
+        update = dict[str, object](uri=self.resolve_uri(snap.uri))
+        if snap.har_blob is not None:
+            update["har"] = self.open(snap.har_blob, ".har")
+        return snap.model_copy(update=update)
+
+    def evict(self, keep: Iterable[str] = ()) -> set[str]:
+        """
+        Delete the least recently used blobs (except those in `keep`) until the store fits
+        in `max_bytes`, along with the snapshots that use them. Returns the evicted digests.
+        """
+        if self.max_bytes is None:
+            return set()
+        evicted = self.store.evict_blobs(self.max_bytes, keep=set(keep))
+        for digest in evicted:
+            self._path(digest).unlink(missing_ok=True)
+            for path in self._cache_dir.glob(f"{digest}.*"):
+                path.unlink(missing_ok=True)
+        return evicted
@@ -0,0 +1,110 @@
+import sys
+import time
+from importlib.abc import Loader, MetaPathFinder
+from importlib.machinery import ModuleSpec
+from types import ModuleType
+from typing import Any, Sequence
+
+from .tracing import Tracer
+
+_profiler: "StartupProfiler | None" = None
+
+
+class StartupProfiler(MetaPathFinder):
+    """
+    Times every module imported from `start()` on (like `python -X importtime`), plus the
+    milestones passed to `mark()`, and prints the slowest of them in `report()`
+    """
+
+    def __init__(self) -> None:
+        self.start_time = time.perf_counter()
+        self.tracer = Tracer()
+        self.cumulative = dict[str, float]()
+        self.self_time = dict[str, float]()
+        self.marks = list[tuple[str, float]]()
+        self.total = 0.0
+        "Time spent importing, not counting nested imports twice"
+        self._stack = list[float]()
+        "Time spent in nested imports, for each import in progress"
+
+    def start(self) -> None:
+        global _profiler
+        _profiler = self
+        sys.meta_path.insert(0, self)
+
+    def stop(self) -> None:
+        global _profiler
+        _profiler = None
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def find_spec(
+        self, fullname: str, path: Sequence[str] | None, target: ModuleType | None = None
+    ) -> ModuleSpec | None:
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = _TimedLoader(spec.loader, self)
+                return spec
+        return None
+
+    def _exec(self, loader: Loader, module: ModuleType) -> None:
+        self._stack.append(0.0)
+        with self.tracer.span(f"import {module.__name__}"):
+            start = time.perf_counter()
+            try:
+                loader.exec_module(module)
+            finally:
+                elapsed = time.perf_counter() - start
+                nested = self._stack.pop()
+                if self._stack:
+                    self._stack[-1] += elapsed
+                else:
+                    self.total += elapsed
+                self.cumulative[module.__name__] = elapsed
+                self.self_time[module.__name__] = elapsed - nested
+
+    def mark(self, name: str) -> None:
+        self.marks.append((name, time.perf_counter() - self.start_time))
+
+    def report(self, limit: int = 20) -> None:
+        self.stop()
+        print(f"Imported {len(self.cumulative)} modules in {self.total:.3f}s")
+        for name, elapsed in self.marks:
+            print(f"{name}: {elapsed:.3f}s after startup")
+        print("\nSlowest imports (cumulative / self):")
+        slowest = sorted(self.cumulative.items(), key=lambda item: -item[1])[:limit]
+        for name, elapsed in slowest:
+            print(f"  {elapsed * 1000:8.1f}ms {self.self_time[name] * 1000:8.1f}ms  {name}")
+
+        from .env import Context
+        from .logs import rotating_path
+
+        path = rotating_path(Context.home_p / "traces" / "startup", suffix=".json", keep=20)
+        self.tracer.export(path)
+        print(f"\nTrace (Chrome trace format): {path}")
+
+
+class _TimedLoader(Loader):
+    def __init__(self, loader: Loader, profiler: StartupProfiler):
+        self._loader = loader
+        self._profiler = profiler
+
+    def __getattr__(self, name: str) -> Any:
+        # Everything else (get_resource_reader, get_data, ...) goes to the real loader
+        return getattr(self._loader, name)
+
+    def create_module(self, spec: ModuleSpec) -> ModuleType | None:
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module: ModuleType) -> None:
+        self._profiler._exec(self._loader, module)
+
+
+def mark(name: str) -> None:
+    """Record that startup reached a milestone. Does nothing unless profiling."""
+    if _profiler is not None:
+        _profiler.mark(name)
@@ -0,0 +1,230 @@
+import json
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable
+
+from .env import Config, ContextInfo, ProcedureInfoConfigOnly, Snapshot
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS contexts (
+    name TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS procedures (
+    name TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    procedure TEXT NOT NULL REFERENCES procedures (name) ON DELETE CASCADE,
+    uri TEXT NOT NULL,
+    time TEXT NOT NULL,
+    data TEXT NOT NULL,
+    UNIQUE (procedure, uri, time)
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    digest TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    last_used TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS snapshot_blobs (
+    snapshot INTEGER NOT NULL REFERENCES snapshots (id) ON DELETE CASCADE,
+    digest TEXT NOT NULL,
+    PRIMARY KEY (snapshot, digest)
+);
+CREATE INDEX IF NOT EXISTS snapshot_blobs_digest ON snapshot_blobs (digest);
+"""
+
+
+class MetadataStore:
+    """
+    SQLite (WAL) storage for `Config`. Procedures and snapshots are written one at a time in
+    their own transactions instead of rewriting everything on every change.
+    """
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA foreign_keys=ON")
+        linked = self._has_table("snapshot_blobs")
+        with self._db:
+            self._db.executescript(_SCHEMA)
+            if not linked:
+                # Stores from before the blobs of snapshots were tracked
+                rows = self._db.execute("SELECT id, data FROM snapshots").fetchall()
+                for snapshot_id, data in rows:
+                    self._link_blobs(snapshot_id, Snapshot.model_validate_json(data))
+
+    def _has_table(self, name: str) -> bool:
+        return self._db.execute(
+            "SELECT EXISTS (SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?)",
+            (name,),
+        ).fetchone()[0]
+
+    def is_empty(self) -> bool:
+        return not self._db.execute(
+            "SELECT EXISTS (SELECT 1 FROM settings) OR EXISTS (SELECT 1 FROM procedures)"
+        ).fetchone()[0]
+
+    def load(self, import_from: Path | None = None) -> Config:
+        """
+        Load the config. The first time, this imports the old `data.json` at `import_from`
+        if there is one.
+        """
+        if self.is_empty():
+            if import_from is not None and import_from.exists():
+                config = Config.load_from_path(import_from)
+            else:
+                config = Config()
+            self.save_config(config)
+            return config
+
+        settings = {
+            key: json.loads(value) for key, value in self._db.execute("SELECT * FROM settings")
+        }
+        contexts = {
+            name: ContextInfo.model_validate_json(data)
+            for name, data in self._db.execute("SELECT name, data FROM contexts")
+        }
+        snapshots = dict[str, list[Snapshot]]()
+        for procedure, data in self._db.execute(
+            "SELECT procedure, data FROM snapshots ORDER BY id"
+        ):
+            snapshots.setdefault(procedure, []).append(Snapshot.model_validate_json(data))
+        procedures = {
+            name: ProcedureInfoConfigOnly.model_validate(
+                {**json.loads(data), "snapshots": snapshots.get(name, [])}
+            )
+            for name, data in self._db.execute("SELECT name, data FROM procedures")
+        }
+        return Config.model_validate(
+            settings | {"contexts": contexts, "procedures": procedures}
+        )
+
+    def save_config(self, config: Config) -> None:
+        """Replace everything with `config`"""
+        with self._db:
+            self._db.execute("DELETE FROM settings")
+            self._db.execute("DELETE FROM contexts")
+            self._db.execute("DELETE FROM procedures")
+            self._save_settings(config)
+            self._db.executemany(
+                "INSERT INTO contexts VALUES (?, ?)",
+                [(name, info.model_dump_json()) for name, info in config.contexts.items()],
+            )
+            for name, proc in config.procedures.items():
+                self._save_procedure(name, proc)
+
+    def _save_settings(self, config: Config) -> None:
+        settings = config.model_dump(mode="json", exclude={"contexts", "procedures"})
+        self._db.executemany(
+            "INSERT OR REPLACE INTO settings VALUES (?, ?)",
+            [(key, json.dumps(value)) for key, value in settings.items()],
+        )
+
+    def save_procedure(self, name: str, proc: ProcedureInfoConfigOnly) -> None:
+        with self._db:
+            self._save_procedure(name, proc)
+
+    def _save_procedure(self, name: str, proc: ProcedureInfoConfigOnly) -> None:
+        # Dump through the config-only model so runtime fields (like the name) are left out
+        data = ProcedureInfoConfigOnly.model_validate(dict(proc)).model_dump_json(
+            exclude={"snapshots"}
+        )
+        self._db.execute(
+            "INSERT INTO procedures VALUES (?, ?) ON CONFLICT (name) DO UPDATE SET data = ?",
+            (name, data, data),
+        )
+
+        keys = {(snap.uri, snap.time.isoformat()): snap for snap in proc.snapshots}
+        existing = set(
+            self._db.execute("SELECT uri, time FROM snapshots WHERE procedure = ?", (name,))
+        )
+        self._db.executemany(
+            "DELETE FROM snapshots WHERE procedure = ? AND uri = ? AND time = ?",
+            [(name, *key) for key in existing - keys.keys()],
+        )
+        self._insert_snapshots(
+            name, [snap for key, snap in keys.items() if key not in existing]
+        )
+
+    def delete_procedure(self, name: str) -> None:
+        with self._db:
+            self._db.execute("DELETE FROM procedures WHERE name = ?", (name,))
+
+    def add_snapshots_of(self, snapshots: dict[str, list[Snapshot]]) -> None:
+        """Add the snapshots of several procedures (keyed by name) in one transaction"""
+        with self._db:
+            for name, snaps in snapshots.items():
+                self._insert_snapshots(name, snaps)
+
+    def remove_snapshots(self, name: str, snapshots: Iterable[Snapshot]) -> None:
+        with self._db:
+            self._db.executemany(
+                "DELETE FROM snapshots WHERE procedure = ? AND uri = ? AND time = ?",
+                [(name, snap.uri, snap.time.isoformat()) for snap in snapshots],
+            )
+
+    def _insert_snapshots(self, name: str, snapshots: Iterable[Snapshot]) -> None:
+        for snap in snapshots:
+            cursor = self._db.execute(
+                "INSERT OR IGNORE INTO snapshots (procedure, uri, time, data)"
+                " VALUES (?, ?, ?, ?)",
+                (name, snap.uri, snap.time.isoformat(), snap.model_dump_json()),
+            )
+            if cursor.rowcount:
+                assert cursor.lastrowid is not None
+                self._link_blobs(cursor.lastrowid, snap)
+
+    def _link_blobs(self, snapshot_id: int, snap: Snapshot) -> None:
+        self._db.executemany(
+            "INSERT OR IGNORE INTO snapshot_blobs VALUES (?, ?)",
+            [(snapshot_id, digest) for digest in snap.blobs],
+        )
+
+    def add_blob(self, digest: str, size: int) -> None:
+        """Track a blob of the snapshot store, or mark it used if it already is"""
+        now = datetime.now().isoformat()
+        with self._db:
+            self._db.execute(
+                "INSERT INTO blobs VALUES (?, ?, ?)"
+                " ON CONFLICT (digest) DO UPDATE SET last_used = ?",
+                (digest, size, now, now),
+            )
+
+    def touch_blob(self, digest: str) -> None:
+        with self._db:
+            self._db.execute(
+                "UPDATE blobs SET last_used = ? WHERE digest = ?",
+                (datetime.now().isoformat(), digest),
+            )
+
+    def evict_blobs(self, max_bytes: int, *, keep: set[str]) -> set[str]:
+        """
+        Forget the least recently used blobs until the rest add up to at most `max_bytes`,
+        and delete the snapshots that refer to them in the same transaction
+        """
+        rows = self._db.execute("SELECT digest, size FROM blobs ORDER BY last_used").fetchall()
+        total = sum(size for _, size in rows)
+        evicted = set[str]()
+        for digest, size in rows:
+            if total <= max_bytes:
+                break
+            if digest not in keep:
+                evicted.add(digest)
+                total -= size
+        with self._db:
+            for digest in evicted:
+                self._db.execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+                self._db.execute(
+                    "DELETE FROM snapshots WHERE id IN"
+                    " (SELECT snapshot FROM snapshot_blobs WHERE digest = ?)",
+                    (digest,),
+                )
+        return evicted
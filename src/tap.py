@@ -0,0 +1,159 @@
+import asyncio
+import json
+import re
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, AsyncIterator
+
+from playwright.async_api import BrowserContext, Error, Page, Response
+
+MAX_BODY_BYTES = 10 * 1024 * 1024
+"Larger responses are skipped rather than buffered"
+MAX_BUFFERED = 1000
+"""Unread responses kept per tap. Responses arriving while it is full are dropped (and
+counted in `ResponseTap.dropped`)."""
+MAX_BUFFERED_BYTES = 100 * 1024 * 1024
+"Total size of the unread responses kept per tap, past which new ones are dropped too"
+
+
+@dataclass
+class TappedResponse:
+    url: str
+    status: int
+    body: bytes
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status < 300
+
+    def json(self) -> Any:
+        return json.loads(self.body)
+
+    def text(self) -> str:
+        return self.body.decode(errors="replace")
+
+
+def tap(page: Page, pattern: str, **kwargs: Any) -> "ResponseTap":
+    """
+    Start buffering the responses (of every page of `page`'s context) whose url matches the
+    regular expression `pattern`. Do this before the request is made, e.g.
+
+        statements = tap(page, r"/api/statements")
+        await page.reload()
+        data = await statements.json()
+    """
+    return ResponseTap(pattern, **kwargs).attach(page.context)
+
+
+class ResponseTap:
+    """
+    Collects the bodies of matching responses as they arrive, so procedures can read the
+    JSON a page was rendered from instead of scraping the DOM. Await `next()`/`json()` for
+    the next response, or `async for response in tap` until the tap is closed.
+    """
+
+    def __init__(
+        self,
+        pattern: str | re.Pattern[str],
+        *,
+        max_body_bytes: int = MAX_BODY_BYTES,
+        max_buffered: int = MAX_BUFFERED,
+        max_buffered_bytes: int = MAX_BUFFERED_BYTES,
+    ):
+        self.pattern = re.compile(pattern)
+        self.max_body_bytes = max_body_bytes
+        self.max_buffered = max_buffered
+        self.max_buffered_bytes = max_buffered_bytes
+        self.responses = deque[TappedResponse]()
+        """Captured responses not read yet (by `next()` or `async for`), in the order their
+        bodies were read"""
+        self.skipped = 0
+        "Responses that were too large or whose body couldn't be read"
+        self.dropped = 0
+        "Responses that arrived while the unread ones were over `max_buffered(_bytes)`"
+        self._buffered_bytes = 0
+        self._arrived = asyncio.Event()
+        self._pending = set[asyncio.Task[None]]()
+        self._context: BrowserContext | None = None
+        self._closed = False
+
+    def attach(self, context: BrowserContext) -> "ResponseTap":
+        self._context = context
+        context.on("response", self._on_response)
+        return self
+
+    def close(self) -> None:
+        """Stop capturing. Responses already captured can still be read."""
+        if self._context is not None:
+            self._context.remove_listener("response", self._on_response)
+            self._context = None
+        self._closed = True
+        self._arrived.set()
+
+    def __enter__(self) -> "ResponseTap":
+        return self
+
+    def __exit__(self, *_exc: Any) -> None:
+        self.close()
+
+    def _on_response(self, response: Response) -> None:
+        if not self.pattern.search(response.url):
+            return
+        length = response.headers.get("content-length")
+        if length and length.isdigit() and int(length) > self.max_body_bytes:
+            self.skipped += 1
+            return
+        task = asyncio.create_task(self._read(response))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _read(self, response: Response) -> None:
+        try:
+            body = await response.body()
+        except Error:
+            # Redirects have no body, and the page may have navigated away before it was read
+            self.skipped += 1
+            return
+        if len(body) > self.max_body_bytes:
+            self.skipped += 1
+        elif (
+            len(self.responses) >= self.max_buffered
+            or self._buffered_bytes + len(body) > self.max_buffered_bytes
+        ):
+            self.dropped += 1
+        else:
+            self.responses.append(TappedResponse(response.url, response.status, body))
+            self._buffered_bytes += len(body)
+            self._arrived.set()
+
+    def _pop(self) -> TappedResponse:
+        response = self.responses.popleft()
+        self._buffered_bytes -= len(response.body)
+        return response
+
+    async def settle(self) -> None:
+        """Wait until the bodies of the responses seen so far have been read"""
+        while self._pending:
+            await asyncio.gather(*self._pending)
+
+    async def next(self, timeout: float | None = 30) -> TappedResponse:
+        """Return the next captured response, waiting for it if necessary"""
+        while not self.responses:
+            if self._closed:
+                raise EOFError("The tap was closed")
+            self._arrived.clear()
+            await asyncio.wait_for(self._arrived.wait(), timeout)
+        return self._pop()
+
+    async def json(self, timeout: float | None = 30) -> Any:
+        """Return the parsed body of the next captured response"""
+        return (await self.next(timeout)).json()
+
+    async def __aiter__(self) -> AsyncIterator[TappedResponse]:
+        while True:
+            while self.responses:
+                yield self._pop()
+            if self._closed:
+                return
+            self._arrived.clear()
+            await self._arrived.wait()
@@ -0,0 +1,106 @@
+import asyncio
+import json
+import os
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, ContextManager, Iterator
+
+_active = ContextVar["Tracer | None"]("tracer", default=None)
+
+
+@dataclass
+class Span:
+    name: str
+    start: float
+    "Wall clock time (seconds since the epoch), so spans from other processes line up"
+    duration: float
+    "Seconds"
+    pid: int
+    tid: int
+    args: dict[str, Any] = field(default_factory=dict)
+
+
+class Tracer:
+    """
+    Records how long each phase of a run takes. Spans are recorded with `Tracer.span()`, or
+    with the module level `span()` while the tracer is active (which procedures can use too).
+    """
+
+    def __init__(self) -> None:
+        self.spans = list[Span]()
+        self._tids = dict[int, int]()
+
+    @contextmanager
+    def activate(self) -> Iterator["Tracer"]:
+        """Make this the tracer used by `span()` in the current task (and tasks it starts)"""
+        token = _active.set(self)
+        try:
+            yield self
+        finally:
+            _active.reset(token)
+
+    @contextmanager
+    def span(self, name: str, /, **args: Any) -> Iterator[None]:
+        start, counter = time.time(), time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - counter
+            self.spans.append(Span(name, start, duration, os.getpid(), self._tid(), args))
+
+    def _tid(self) -> int:
+        """A small number per asyncio task, so concurrent spans show up as separate rows"""
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        return self._tids.setdefault(id(task), len(self._tids))
+
+    def summary(self) -> list[str]:
+        """One line per span name with the count, total and slowest time, slowest first"""
+        totals = dict[str, list[float]]()
+        for span in self.spans:
+            totals.setdefault(span.name, []).append(span.duration)
+        return [
+            f"{name}: {len(times)}x, {sum(times):.3f}s total, {max(times):.3f}s max"
+            for name, times in sorted(totals.items(), key=lambda item: -sum(item[1]))
+        ]
+
+    def to_chrome_trace(self) -> dict[str, Any]:
+        """The spans in Chrome's trace event format (for chrome://tracing or Perfetto)"""
+        return {
+            "traceEvents": [
+                {
+                    "name": span.name,
+                    "cat": "state_dl",
+                    "ph": "X",
+                    "ts": span.start * 1e6,
+                    "dur": span.duration * 1e6,
+                    "pid": span.pid,
+                    "tid": span.tid,
+                    "args": span.args,
+                }
+                for span in self.spans
+            ],
+            "displayTimeUnit": "ms",
+        }
+
+    def export(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.to_chrome_trace()))
+
+
+def current_tracer() -> Tracer | None:
+    return _active.get()
+
+
+def span(name: str, /, **args: Any) -> ContextManager[None]:
+    """
+    Time a block as part of the current run's trace, e.g. `with span("login"): ...`. Does
+    nothing when no tracer is active.
+    """
+    tracer = _active.get()
+    return tracer.span(name, **args) if tracer else nullcontext()
@@ -0,0 +1,105 @@
+import asyncio
+import ctypes
+import ctypes.util
+import os
+import struct
+import sys
+from pathlib import Path
+from typing import Callable
+
+# From <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+_EVENT = struct.Struct("iIII")
+POLL_INTERVAL = 0.5
+
+
+class FileWatcher:
+    """
+    Calls `callback` soon after `path` is written. Uses inotify on Linux (watching the
+    directory, since many editors save by replacing the file) and polls the mtime elsewhere.
+    """
+
+    def __init__(self, path: Path, callback: Callable[[], None]):
+        self.path = path
+        self.callback = callback
+        self._fd: int | None = None
+        self._poll_task: asyncio.Task | None = None
+        self._scheduled = False
+
+    def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        self._fd = _inotify_watch(self.path.parent)
+        if self._fd is not None:
+            loop.add_reader(self._fd, self._read_events)
+        else:
+            self._poll_task = loop.create_task(self._poll())
+
+    def stop(self) -> None:
+        if self._fd is not None:
+            asyncio.get_running_loop().remove_reader(self._fd)
+            os.close(self._fd)
+            self._fd = None
+        if self._poll_task is not None:
+            self._poll_task.cancel()
+            self._poll_task = None
+
+    def _read_events(self) -> None:
+        assert self._fd is not None
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset < len(data):
+            _wd, _mask, _cookie, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+            if os.fsdecode(name) == self.path.name:
+                self._schedule_callback()
+
+    def _schedule_callback(self) -> None:
+        # Saving usually fires several events at once, only refresh once for all of them
+        if not self._scheduled:
+            self._scheduled = True
+            asyncio.get_running_loop().call_soon(self._run_callback)
+
+    def _run_callback(self) -> None:
+        self._scheduled = False
+        self.callback()
+
+    async def _poll(self) -> None:
+        last = self._mtime()
+        while True:
+            await asyncio.sleep(POLL_INTERVAL)
+            if (mtime := self._mtime()) != last:
+                last = mtime
+                self.callback()
+
+    def _mtime(self) -> int | None:
+        try:
+            return self.path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+
+def _inotify_watch(directory: Path) -> int | None:
+    """Return an inotify file descriptor watching `directory`, or None if unavailable"""
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if fd < 0:
+        return None
+    # Only react once the file is completely written, not to every partial write
+    if libc.inotify_add_watch(fd, os.fsencode(directory), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+        os.close(fd)
+        return None
+    return fd
@@ -1,8 +1,12 @@
+import io
+import re
 import shlex
+import tokenize
 from pathlib import Path
 from subprocess import Popen
 
 from rich.syntax import Syntax
+from rich.text import Text
 from textual.app import ComposeResult
 from textual.binding import Binding
 from textual.containers import ScrollableContainer
@@ -11,6 +15,62 @@ from textual.widgets import Static
 
 from ..env import Context
 from ..utils import suspend_app
+from ..watcher import FileWatcher
+
+# Top-level definitions, where the file can be split and highlighted piece by piece
+_BLOCK_START = re.compile(r"(async\s+def|def|class)\b|@")
+_NON_STATEMENT_TOKENS = {
+    tokenize.NL,
+    tokenize.COMMENT,
+    tokenize.INDENT,
+    tokenize.DEDENT,
+    tokenize.ENDMARKER,
+}
+
+
+def _continued_lines(text: str) -> set[int] | None:
+    """
+    Indexes of the lines that continue a statement started on a previous line (e.g. inside
+    a triple-quoted string). None if the text can't be tokenized.
+    """
+    continued = set[int]()
+    start: int | None = None
+    try:
+        for token in tokenize.generate_tokens(io.StringIO(text).readline):
+            if token.type == tokenize.NEWLINE:
+                start = None
+            elif token.type not in _NON_STATEMENT_TOKENS:
+                if start is None:
+                    start = token.start[0]
+                # Rows start at 1, so the row is the index of the following line
+                continued.update(range(start, token.end[0]))
+    except (tokenize.TokenError, SyntaxError):
+        return None
+    return continued
+
+
+def split_blocks(text: str) -> list[str]:
+    """
+    Split python source before each top-level definition (keeping decorators attached).
+    Source that can't be tokenized, like an unterminated string, is a single block.
+    """
+    if (continued := _continued_lines(text)) is None:
+        return [text]
+    blocks = list[str]()
+    current = list[str]()
+    for i, line in enumerate(text.splitlines(keepends=True)):
+        if (
+            current
+            and i not in continued
+            and _BLOCK_START.match(line)
+            and not current[-1].startswith("@")
+        ):
+            blocks.append("".join(current))
+            current = []
+        current.append(line)
+    if current:
+        blocks.append("".join(current))
+    return blocks
 
 
 class Editor(ScrollableContainer, can_focus=True):
@@ -35,6 +95,10 @@ class Editor(ScrollableContainer, can_focus=True):
         self.file_path = file_path
         if not file_path.exists():
             file_path.write_text(default_contents)
+        self._syntax = Syntax("", lexer="python")
+        self._highlighted = dict[str, Text]()
+        "Highlighted blocks of the file from the last refresh, keyed by their source"
+        self._watcher = FileWatcher(file_path, self._update_scroll_view)
 
     def compose(self) -> ComposeResult:
         self.scroll_view = Static(id="editor")
@@ -42,6 +106,12 @@ class Editor(ScrollableContainer, can_focus=True):
         yield self.scroll_view
         yield Static("<EOF>", id="eof")
 
+    def on_mount(self):
+        self._watcher.start()
+
+    def on_unmount(self):
+        self._watcher.stop()
+
     def on_click(self):
         self.action_edit()
 
@@ -61,7 +131,8 @@ class Editor(ScrollableContainer, can_focus=True):
                 _open().wait()
             self._update_scroll_view()
         else:
-            self.scroll_view.update("File is open in external editor")
+            # The file watcher refreshes the view on every save, this only tracks when the
+            # editor is closed so it can be opened again
             self._editor_process = _open()
             self._editor_timer = self.set_interval(3, self._poll_external_editor)
 
@@ -70,12 +141,20 @@ class Editor(ScrollableContainer, can_focus=True):
         if self._editor_process.poll() is None:
             return  # Editor is still running
 
-        self._update_scroll_view()
         self._editor_timer.stop()
         self._editor_process = self._editor_timer = None
 
     def _update_scroll_view(self):
-        # Performance be damned
         self.text = self.file_path.read_text()
         self.scroll_view.styles.height = 1 + self.text.count("\n")
-        self.scroll_view.update(Syntax(self.text, lexer="python"))
+
+        # Only highlight the blocks that changed since the last refresh
+        highlighted = dict[str, Text]()
+        content = Text()
+        for block in split_blocks(self.text):
+            if block not in highlighted:
+                cached = self._highlighted.get(block)
+                highlighted[block] = cached or self._syntax.highlight(block)
+            content.append_text(highlighted[block])
+        self._highlighted = highlighted
+        self.scroll_view.update(content)
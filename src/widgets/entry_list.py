@@ -0,0 +1,191 @@
+from array import array
+
+from rich.segment import Segment
+from rich.style import Style
+from textual.binding import Binding
+from textual.events import Click
+from textual.geometry import Region, Size
+from textual.scroll_view import ScrollView
+from textual.strip import Strip
+
+from ..entry_store import FAILED, PROCESSED, EntryStore
+
+
+class EntryList(ScrollView, can_focus=True):
+    """
+    A checkbox list of the entries in an `EntryStore` that only renders the visible rows.
+    Space toggles an entry, shift+arrows or shift+click select a range.
+    """
+
+    BINDINGS = [
+        Binding("up", "cursor_up", "Up", show=False),
+        Binding("down", "cursor_down", "Down", show=False),
+        Binding("pageup", "page_up", "Page Up", show=False),
+        Binding("pagedown", "page_down", "Page Down", show=False),
+        Binding("home", "first", "First", show=False),
+        Binding("end", "last", "Last", show=False),
+        Binding("shift+up", "extend_up", "Select up", show=False),
+        Binding("shift+down", "extend_down", "Select down", show=False),
+        Binding("space", "toggle", "Toggle entry"),
+        Binding("a", "select_all", "Select shown"),
+        Binding("n", "select_none", "Deselect shown"),
+    ]
+
+    COMPONENT_CLASSES = {"entry-list--cursor", "entry-list--processed", "entry-list--failed"}
+
+    DEFAULT_CSS = """
+    EntryList {
+        height: auto;
+        max-height: 20;
+        overflow-x: hidden;
+        overflow-y: auto;
+    }
+    EntryList > .entry-list--cursor {
+        background: $accent 50%;
+    }
+    EntryList > .entry-list--processed {
+        color: $text-muted;
+    }
+    EntryList > .entry-list--failed {
+        color: $error;
+    }
+    """
+
+    def __init__(
+        self,
+        store: EntryStore,
+        name: str | None = None,
+        id: str | None = None,
+        classes: str | None = None,
+    ) -> None:
+        super().__init__(name=name, id=id, classes=classes)
+        self.store = store
+        self.query_text = ""
+        self.hide_processed = False
+        self.cursor = 0
+        "Row of the highlighted entry"
+        self._anchor: int | None = None
+        "Row where the current range selection started"
+        self._range_selects = True
+        "Whether the current range selects or deselects entries"
+        self._view = array("I")
+        "Slots of the entries shown, in order"
+
+    def refresh_view(self) -> None:
+        """Re-apply the filter, e.g. after entries were added or processed"""
+        if self.query_text or self.hide_processed:
+            self._view = self.store.view(self.query_text, hide_processed=self.hide_processed)
+        else:
+            self._view = array("I", range(len(self.store)))
+        self.cursor = max(0, min(self.cursor, len(self._view) - 1))
+        self.virtual_size = Size(self.scrollable_content_region.width, len(self._view))
+        self.refresh()
+
+    def set_filter(self, query: str) -> None:
+        self.query_text = query
+        self.cursor = 0
+        self._anchor = None
+        self.refresh_view()
+        self.scroll_home(animate=False)
+
+    @property
+    def shown(self) -> int:
+        return len(self._view)
+
+    def render_line(self, y: int) -> Strip:
+        width = self.scrollable_content_region.width
+        row = self.scroll_offset.y + y
+        if row >= len(self._view):
+            return Strip.blank(width, self.rich_style)
+        slot = self._view[row]
+        entry = self.store.entry(slot)
+
+        box = "[x] " if self.store.selected[slot] else "[ ] "
+        segments = [Segment(box + entry.label, self.rich_style)]
+        status = self.store.status[slot]
+        if status == PROCESSED:
+            style = self.get_component_rich_style("entry-list--processed")
+            segments.append(Segment(" (processed)", self.rich_style + style))
+        elif status == FAILED:
+            style = self.get_component_rich_style("entry-list--failed")
+            segments.append(Segment(" (failed)", self.rich_style + style))
+        strip = Strip(segments).crop(0, width).adjust_cell_length(width, self.rich_style)
+        if row == self.cursor and self.has_focus:
+            strip = strip.apply_style(self.get_component_rich_style("entry-list--cursor"))
+        return strip.apply_style(Style.from_meta({"row": row}))
+
+    def _move(self, row: int, *, extend: bool = False) -> None:
+        if not self._view:
+            return
+        row = max(0, min(row, len(self._view) - 1))
+        if extend:
+            if self._anchor is None:
+                self._anchor = self.cursor
+                self._range_selects = True
+            start, end = sorted((self._anchor, row))
+            self.store.select(self._view[start : end + 1], self._range_selects)
+        else:
+            self._anchor = None
+        self.cursor = row
+        self.scroll_to_region(
+            Region(0, row, self.scrollable_content_region.width, 1), animate=False
+        )
+        self.refresh()
+
+    def on_focus(self) -> None:
+        self.refresh()
+
+    def on_blur(self) -> None:
+        self.refresh()
+
+    async def _on_click(self, event: Click) -> None:
+        await super()._on_click(event)
+        row = event.style.meta.get("row")
+        if row is None:
+            return
+        if event.shift:
+            self._move(row, extend=True)
+        else:
+            self._move(row)
+            self.action_toggle()
+
+    def action_cursor_up(self) -> None:
+        self._move(self.cursor - 1)
+
+    def action_cursor_down(self) -> None:
+        self._move(self.cursor + 1)
+
+    def action_page_up(self) -> None:
+        self._move(self.cursor - self.scrollable_content_region.height)
+
+    def action_page_down(self) -> None:
+        self._move(self.cursor + self.scrollable_content_region.height)
+
+    def action_first(self) -> None:
+        self._move(0)
+
+    def action_last(self) -> None:
+        self._move(len(self._view) - 1)
+
+    def action_extend_up(self) -> None:
+        self._move(self.cursor - 1, extend=True)
+
+    def action_extend_down(self) -> None:
+        self._move(self.cursor + 1, extend=True)
+
+    def action_toggle(self) -> None:
+        if self._view:
+            slot = self._view[self.cursor]
+            self.store.selected[slot] = not self.store.selected[slot]
+            # A following shift+click selects (or deselects) everything in between
+            self._anchor = self.cursor
+            self._range_selects = bool(self.store.selected[slot])
+            self.refresh()
+
+    def action_select_all(self) -> None:
+        self.store.select(self._view, True)
+        self.refresh()
+
+    def action_select_none(self) -> None:
+        self.store.select(self._view, False)
+        self.refresh()
@@ -0,0 +1,347 @@
+import asyncio
+import dataclasses
+import io
+import multiprocessing
+import pickle
+import queue
+import sys
+import time
+import traceback
+from dataclasses import dataclass, field
+from multiprocessing.process import BaseProcess
+from multiprocessing.queues import Queue
+from types import ModuleType, SimpleNamespace
+from typing import TYPE_CHECKING, Any, Callable, Literal, TextIO, cast
+
+from .env import ProcedureInfo, Snapshot
+from .execution import EntryResult, batched, iter_find
+from .memory import rss_mb
+from .tracing import Span, Tracer, current_tracer
+
+if TYPE_CHECKING:
+    from .env import Context
+
+POLL_INTERVAL = 0.1
+"Seconds between checks of a worker's deadline and memory usage"
+
+
+class WorkerError(Exception):
+    """The procedure raised an exception inside the worker"""
+
+
+class WorkerKilled(WorkerError):
+    """The worker exceeded its time or memory limit (or died) and was killed"""
+
+
+@dataclass
+class WorkerJob:
+    kind: Literal["find", "process"]
+    proc: ProcedureInfo
+    cdp_endpoint: str
+    headless: bool
+    url: str | None = None
+    "Where to start. Ignored if `snapshot` is given"
+    snapshot: Snapshot | None = None
+    entries: list[dict[str, Any]] | None = None
+    "Entries to process, as the fields of the procedure's `Entry`"
+
+
+@dataclass
+class WorkerResult:
+    entries: list[SimpleNamespace] | None = None
+    "Entries returned by `find()`, with the same attributes as the procedure's `Entry`"
+    results: list[EntryResult] | None = None
+    "Outcome of each entry passed to `process()`"
+    downloads: int = 0
+    blocked: int = 0
+    spans: list[Span] = field(default_factory=list)
+    "Timings recorded in the worker, added to the caller's trace"
+
+
+def entry_fields(entry: Any) -> dict[str, Any]:
+    """Turn an entry into something that can be sent to (or from) a worker"""
+    if dataclasses.is_dataclass(entry):
+        return dataclasses.asdict(entry)
+    return dict(vars(entry))
+
+
+class _Worker:
+    def __init__(self) -> None:
+        mp = multiprocessing.get_context("spawn")
+        self.jobs: Queue[WorkerJob | None] = mp.Queue()
+        self.events: Queue[tuple[str, Any]] = mp.Queue()
+        self.process: BaseProcess = mp.Process(
+            target=_worker_main, args=(self.jobs, self.events), daemon=True
+        )
+        self.process.start()
+
+    def rss_mb(self) -> float | None:
+        """Resident memory of the worker, or None if unknown"""
+        return rss_mb(self.process.pid) if self.process.pid else None
+
+    def kill(self) -> None:
+        self.process.kill()
+        self.process.join(timeout=1)
+
+    def stop(self) -> None:
+        self.jobs.put(None)
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.kill()
+
+
+class ProcedureWorkerPool:
+    """
+    Runs `find()`/`process()` in reusable worker processes that share the browser of
+    `ctx.browser_pool` over CDP. The procedure is never imported into this process, and a
+    worker that runs too long or uses too much memory is killed (and replaced next time).
+    """
+
+    def __init__(
+        self,
+        ctx: "Context",
+        *,
+        size: int,
+        timeout: float | None,
+        memory_limit_mb: int | None,
+    ):
+        self.ctx = ctx
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+        self._idle = list[_Worker]()
+        self._semaphore = asyncio.Semaphore(size)
+
+    async def find(
+        self,
+        proc: ProcedureInfo,
+        *,
+        url: str | None = None,
+        snapshot: Snapshot | None = None,
+        headless: bool = False,
+        on_output: Callable[[str], object] = sys.stdout.write,
+        on_entries: Callable[[list[SimpleNamespace]], object] | None = None,
+    ) -> WorkerResult:
+        """
+        Run `find()`, passing entries to `on_entries` in batches as they are found. If the
+        worker is killed, the entries found until then have already been passed on.
+        """
+        return await self._run(
+            "find",
+            proc,
+            url=url,
+            snapshot=snapshot,
+            headless=headless,
+            on_output=on_output,
+            on_entries=on_entries,
+        )
+
+    async def process(
+        self,
+        proc: ProcedureInfo,
+        entries: list[Any],
+        *,
+        url: str | None = None,
+        snapshot: Snapshot | None = None,
+        headless: bool = False,
+        on_output: Callable[[str], object] = sys.stdout.write,
+        on_result: Callable[[EntryResult], object] | None = None,
+    ) -> WorkerResult:
+        """
+        Run `process()`, passing the result of each entry to `on_result` as soon as it is
+        done. If the worker is killed, the results until then have already been passed on.
+        """
+        return await self._run(
+            "process",
+            proc,
+            url=url,
+            snapshot=snapshot,
+            headless=headless,
+            on_output=on_output,
+            on_result=on_result,
+            entries=[entry_fields(entry) for entry in entries],
+        )
+
+    async def _run(
+        self,
+        kind: Literal["find", "process"],
+        proc: ProcedureInfo,
+        *,
+        url: str | None,
+        snapshot: Snapshot | None,
+        headless: bool,
+        on_output: Callable[[str], object],
+        on_entries: Callable[[list[SimpleNamespace]], object] | None = None,
+        on_result: Callable[[EntryResult], object] | None = None,
+        entries: list[dict[str, Any]] | None = None,
+    ) -> WorkerResult:
+        async with self._semaphore, self.ctx.browser_pool.shared_endpoint(
+            headless=headless
+        ) as endpoint:
+            worker = self._idle.pop() if self._idle else _Worker()
+            job = WorkerJob(kind, proc, endpoint, headless, url, snapshot, entries)
+            reusable = False
+            try:
+                worker.jobs.put(job)
+                result = await self._wait(worker, on_output, on_entries, on_result)
+                reusable = True
+            except WorkerKilled:
+                raise
+            except WorkerError:
+                # Only the procedure failed, the worker is waiting for its next job
+                reusable = True
+                raise
+            finally:
+                # Otherwise it was killed, or it is still running a job nobody waits for
+                if reusable:
+                    self._idle.append(worker)
+                else:
+                    worker.kill()
+            if tracer := current_tracer():
+                tracer.spans.extend(result.spans)
+            return result
+
+    async def _wait(
+        self,
+        worker: _Worker,
+        on_output: Callable[[str], object],
+        on_entries: Callable[[list[SimpleNamespace]], object] | None,
+        on_result: Callable[[EntryResult], object] | None,
+    ) -> WorkerResult:
+        found = list[SimpleNamespace]()
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        while True:
+            try:
+                kind, payload = await asyncio.to_thread(
+                    worker.events.get, timeout=POLL_INTERVAL
+                )
+            except queue.Empty:
+                self._check_limits(worker, deadline)
+                if not worker.process.is_alive():
+                    raise WorkerKilled(f"Worker died (exit code {worker.process.exitcode})")
+                continue
+            # Also while events keep coming, e.g. a procedure printing in a loop
+            self._check_limits(worker, deadline)
+
+            if kind == "output":
+                on_output(payload)
+            elif kind == "entries":
+                found.extend(payload)
+                if on_entries:
+                    on_entries(payload)
+            elif kind == "entry_result":
+                if on_result:
+                    on_result(payload)
+            elif kind == "result":
+                if found:
+                    payload.entries = found
+                return payload
+            elif kind == "error":
+                raise WorkerError(payload)
+
+    def _check_limits(self, worker: _Worker, deadline: float | None) -> None:
+        if deadline is not None and time.monotonic() > deadline:
+            raise WorkerKilled(f"Timed out after {self.timeout}s")
+        rss = worker.rss_mb()
+        if self.memory_limit_mb and rss and rss > self.memory_limit_mb:
+            raise WorkerKilled(f"Exceeded the memory limit ({rss:.0f} MB)")
+
+    def close(self) -> None:
+        for worker in self._idle:
+            worker.stop()
+        self._idle.clear()
+
+
+class _QueueWriter(io.TextIOBase):
+    """Streams everything written to it back to the parent process"""
+
+    def __init__(self, events: "Queue[tuple[str, Any]]"):
+        self._events = events
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        if text:
+            self._events.put(("output", text))
+        return len(text)
+
+
+def _worker_main(jobs: "Queue[WorkerJob | None]", events: "Queue[tuple[str, Any]]") -> None:
+    sys.stdout = sys.stderr = cast(TextIO, _QueueWriter(events))
+    asyncio.run(_serve(jobs, events))
+
+
+async def _serve(jobs: "Queue[WorkerJob | None]", events: "Queue[tuple[str, Any]]") -> None:
+    from .env import Context
+    from .store import MetadataStore
+
+    store = MetadataStore(Context.store_p)
+    ctx = Context(store.load(), store)
+    ctx.browser_pool.idle_timeout = None
+    modules = dict[str, tuple[int, ModuleType]]()
+
+    while (job := await asyncio.to_thread(jobs.get)) is not None:
+        if ctx.browser_pool.cdp_endpoint != job.cdp_endpoint:
+            # The parent's browser was restarted since the last job
+            await ctx.browser_pool.close()
+            ctx.browser_pool.cdp_endpoint = job.cdp_endpoint
+        try:
+            with Tracer().activate() as tracer:
+                result = await _run_job(ctx, job, modules, events)
+            result.spans = tracer.spans
+            # Pickle now, since errors in the queue's background thread would be lost
+            pickle.dumps(result)
+        except Exception:
+            events.put(("error", traceback.format_exc()))
+        else:
+            events.put(("result", result))
+    await ctx.browser_pool.close()
+
+
+async def _run_job(
+    ctx: "Context",
+    job: WorkerJob,
+    modules: dict[str, tuple[int, ModuleType]],
+    events: "Queue[tuple[str, Any]]",
+) -> WorkerResult:
+    from .browser import BrowserWrapper
+    from .execution import run_process
+    from .procedures import import_procedure
+
+    # Only re-import the procedure when it changed since the last job
+    name = job.proc.name
+    mtime = (ctx.procedures_dir_p / f"{name}.py").stat().st_mtime_ns
+    if name not in modules or modules[name][0] != mtime:
+        modules[name] = (mtime, import_procedure(ctx, name))
+    module = modules[name][1]
+
+    wrapper = await BrowserWrapper.init(
+        ctx=ctx,
+        proc=job.proc,
+        initial_url=None if job.snapshot else job.url,
+        headless=job.headless,
+    )
+    try:
+        if job.snapshot:
+            await wrapper.goto_snapshot(job.snapshot)
+        result = WorkerResult()
+        if job.kind == "find":
+            # Entries are streamed to the parent, which collects them into `result.entries`
+            async for batch in batched(iter_find(module, wrapper.page)):
+                fields = [SimpleNamespace(**entry_fields(entry)) for entry in batch]
+                pickle.dumps(fields)
+                events.put(("entries", fields))
+        else:
+            entries = [module.Entry(**fields) for fields in job.entries or []]
+            result.results = await run_process(
+                wrapper,
+                module,
+                entries,
+                on_result=lambda entry: events.put(("entry_result", entry)),
+            )
+            await wrapper.downloads.wait()
+            result.downloads = len(wrapper.downloads.saved)
+        result.blocked = sum(wrapper.blocker.blocked.values())
+        return result
+    finally:
+        await wrapper.close()
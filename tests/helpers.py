@@ -0,0 +1,130 @@
+import shutil
+import sys
+import tempfile
+import textwrap
+import unittest
+from pathlib import Path
+from typing import Any, Callable
+from unittest import mock
+
+from src.env import Context, ProcedureInfo
+from src.store import MetadataStore
+
+
+class FakePage:
+    """The parts of a playwright `Page` that the runner and the recycler use"""
+
+    def __init__(self, context: "FakeContext"):
+        self.context = context
+        self.url = "about:blank"
+        self._closed = False
+        self._handlers = dict[str, list[Callable[..., Any]]]()
+
+    def on(self, event: str, handler: Callable[..., Any]) -> None:
+        self._handlers.setdefault(event, []).append(handler)
+
+    def emit(self, event: str, *args: Any) -> None:
+        for handler in self._handlers.get(event, []):
+            handler(*args)
+
+    def is_closed(self) -> bool:
+        return self._closed or self.context.closed
+
+    async def goto(self, url: str) -> None:
+        self.url = url
+        # Only what `Recycler._on_navigated()` looks at
+        self.emit("framenavigated", mock.Mock(parent_frame=None, page=self))
+
+    async def close(self) -> None:
+        self._closed = True
+        self.emit("close", self)
+
+
+class FakeContext:
+    def __init__(self) -> None:
+        self.closed = False
+        self.pages = list[FakePage]()
+
+    async def new_page(self) -> FakePage:
+        page = FakePage(self)
+        self.pages.append(page)
+        return page
+
+    async def close(self) -> None:
+        self.closed = True
+
+
+class FakeDownloads:
+    def __init__(self) -> None:
+        self.saved = list[Any]()
+
+    async def wait(self) -> None:
+        pass
+
+
+class FakeWrapper:
+    """Stands in for `BrowserWrapper`, without launching a browser"""
+
+    rss_mb: float | None = None
+
+    def __init__(self) -> None:
+        self.context = FakeContext()
+        self.page = FakePage(self.context)
+        self.downloads = FakeDownloads()
+        self.blocker = mock.Mock(policy=None, blocked={})
+        self.recycle_page_after: int | None = None
+        self.browser_memory_limit_mb: int | None = None
+        self.contexts_recycled = 0
+        self.closed = False
+
+    @classmethod
+    async def init(cls, **_kwargs: Any) -> "FakeWrapper":
+        return cls()
+
+    async def goto(self, url: str) -> None:
+        await self.page.goto(url)
+
+    def browser_rss_mb(self) -> float | None:
+        return self.rss_mb
+
+    async def recycle_context(self) -> None:
+        await self.context.close()
+        self.context = FakeContext()
+        self.page = FakePage(self.context)
+        self.contexts_recycled += 1
+
+    async def close(self) -> None:
+        self.closed = True
+        await self.context.close()
+
+
+class ContextTestCase(unittest.IsolatedAsyncioTestCase):
+    """Gives every test a `Context` whose home directory is a fresh temporary one"""
+
+    def setUp(self) -> None:
+        home = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, home, ignore_errors=True)
+        self.patch(Context, "home_p", home)
+        self.patch(Context, "procedures_dir_p", home / "procedure_scripts")
+        self.patch(Context, "config_p", home / "data.json")
+        self.patch(Context, "store_p", home / "data.sqlite3")
+        # `Context` adds the procedures directory to the path
+        self.patch(sys, "path", list(sys.path))
+        Context.procedures_dir_p.mkdir()
+        self.ctx = self.new_context()
+
+    def patch(self, target: Any, attribute: str, value: Any) -> None:
+        patcher = mock.patch.object(target, attribute, value)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def new_context(self) -> Context:
+        store = MetadataStore(Context.store_p)
+        return Context(store.load(), store)
+
+    def add_procedure(self, name: str, source: str) -> ProcedureInfo:
+        """Write a procedure file and return it, as `Context` would find it on startup"""
+        (Context.procedures_dir_p / f"{name}.py").write_text(textwrap.dedent(source))
+        self.addCleanup(lambda: sys.modules.pop(name, None))
+        self.ctx = self.new_context()
+        return self.ctx.all_procedures[name]
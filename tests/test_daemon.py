@@ -0,0 +1,45 @@
+import asyncio
+from typing import Any
+
+from src import daemon
+from src.daemon import Daemon
+from src.env import ProcedureInfo, Schedule, Snapshot
+from src.runner import RunResult
+
+from .helpers import ContextTestCase
+
+
+class DaemonTest(ContextTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.started = list[str]()
+        self.finish = asyncio.Event()
+        self.patch(daemon, "run_procedure", self.run_procedure)
+
+    async def run_procedure(self, _ctx: Any, proc: ProcedureInfo, **_kwargs: Any) -> RunResult:
+        self.started.append(proc.name)
+        await self.finish.wait()
+        return RunResult(proc.name, elapsed=0)
+
+    def procedure(self, name: str, url: str) -> ProcedureInfo:
+        return ProcedureInfo(
+            name=name, snapshots=[Snapshot(uri=url)], schedule=Schedule(interval_minutes=60)
+        )
+
+    async def test_busy_site_leaves_slots_to_others(self) -> None:
+        scheduler = Daemon(
+            self.ctx, concurrency=2, domain_concurrency=1, requests_per_second=None
+        )
+        procs = [
+            self.procedure("checking", "https://bank.test/checking"),
+            self.procedure("savings", "https://bank.test/savings"),
+            self.procedure("phone", "https://phone.test/bills"),
+        ]
+        for proc in procs:
+            scheduler._running[proc.name] = asyncio.create_task(scheduler._run(proc))
+        await asyncio.sleep(0.01)
+        self.assertEqual(self.started, ["checking", "phone"])
+
+        self.finish.set()
+        await asyncio.gather(*scheduler._running.values())
+        self.assertEqual(self.started, ["checking", "phone", "savings"])
@@ -0,0 +1,35 @@
+import unittest
+
+from src.widgets.editor import split_blocks
+
+SOURCE = '''import asyncio
+
+USAGE = """
+def find(page):
+@decorated
+"""
+
+
+@decorated
+async def find(page):
+    yield (
+1)
+
+
+class Entry:
+    pass
+'''
+
+
+class SplitBlocksTest(unittest.TestCase):
+    def test_split_before_definitions(self) -> None:
+        blocks = split_blocks(SOURCE)
+        self.assertEqual("".join(blocks), SOURCE)
+        self.assertEqual(
+            [block.splitlines()[0] for block in blocks],
+            ["import asyncio", "@decorated", "class Entry:"],
+        )
+
+    def test_untokenizable_source_is_one_block(self) -> None:
+        source = 'USAGE = """\ndef find(page):\n'
+        self.assertEqual(split_blocks(source), [source])
@@ -0,0 +1,76 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+from typing import Any, AsyncIterator
+
+from src import recycling
+from src.execution import process_each
+from src.recycling import Recycler
+
+from .helpers import FakePage, FakeWrapper
+
+
+class RecyclerTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.wrapper = FakeWrapper()
+        self.entries = [SimpleNamespace(id=str(i)) for i in range(20)]
+        self.pages = set[FakePage]()
+
+    def recycler(self, **kwargs: Any) -> Recycler:
+        kwargs = {"max_navigations": None, "memory_limit_mb": None, **kwargs}
+        return Recycler(self.wrapper, **kwargs)  # type: ignore[arg-type]
+
+    async def process_one(self, page: Any, entry: Any) -> None:
+        assert not page.is_closed()
+        self.pages.add(page)
+        await page.goto(f"https://bank.test/statements/{entry.id}")
+        await asyncio.sleep(0.001)
+
+    async def test_pages_are_replaced_after_max_navigations(self) -> None:
+        recycler = self.recycler(max_navigations=5)
+        results = await process_each(recycler, self.process_one, self.entries, pages=2)
+        self.assertTrue(all(result.ok for result in results))
+        self.assertEqual(len(self.pages), 4)
+        self.assertEqual(recycler.pages_recycled, 2)
+        self.assertEqual(self.wrapper.contexts_recycled, 0)
+
+    async def test_context_is_replaced_between_entries(self) -> None:
+        self.wrapper.rss_mb = 4096
+        recycler = self.recycler(memory_limit_mb=2048)
+        recycling_context = self.wrapper.recycle_context
+
+        async def _recycle_context() -> None:
+            self.assertEqual(recycler._busy, 0, "entries were still running")
+            await recycling_context()
+            self.wrapper.rss_mb = 512
+
+        self.wrapper.recycle_context = _recycle_context  # type: ignore[method-assign]
+        with unittest.mock.patch.object(recycling, "MEMORY_CHECK_INTERVAL", 0):
+            results = await process_each(recycler, self.process_one, self.entries, pages=4)
+        self.assertTrue(all(result.ok for result in results))
+        self.assertEqual(recycler.contexts_recycled, 1)
+
+    async def test_context_is_kept_while_over_the_limit_anyway(self) -> None:
+        self.wrapper.rss_mb = 4096
+        recycler = self.recycler(memory_limit_mb=2048)
+        with unittest.mock.patch.object(recycling, "MEMORY_CHECK_INTERVAL", 0):
+            await process_each(recycler, self.process_one, self.entries, pages=4)
+        self.assertEqual(recycler.contexts_recycled, 1)
+        self.assertIsNone(recycler.memory_limit_mb)
+
+    async def test_context_is_kept_while_find_runs(self) -> None:
+        self.wrapper.rss_mb = 4096
+        recycler = self.recycler(memory_limit_mb=2048)
+        find_page = self.wrapper.page
+
+        async def _find() -> AsyncIterator[Any]:
+            for entry in self.entries:
+                await asyncio.sleep(0.001)
+                assert not find_page.is_closed(), "find()'s page was closed"
+                yield entry
+
+        with unittest.mock.patch.object(recycling, "MEMORY_CHECK_INTERVAL", 0):
+            results = await process_each(recycler, self.process_one, _find(), pages=4)
+        self.assertTrue(all(result.ok for result in results))
+        self.assertEqual(len(results), len(self.entries))
+        self.assertLessEqual(recycler.contexts_recycled, 1)
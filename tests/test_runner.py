@@ -0,0 +1,133 @@
+import asyncio
+from unittest import mock
+
+from src import runner
+from src.env import Fingerprint
+from src.ratelimit import RateLimiter
+from src.procedures import import_procedure
+from src.tracing import Tracer
+
+from .helpers import ContextTestCase, FakeWrapper
+
+PROCEDURE = """
+import asyncio
+from dataclasses import dataclass
+
+PROCESS_PAGES = 2
+processed = []
+
+
+@dataclass
+class Entry:
+    id: str
+    label: str
+
+
+async def find(page):
+    for id in ["1", "2", "3"]:
+        yield Entry(id, f"Statement {id}")
+    if FIND_FAILS:
+        raise RuntimeError("next page not found")
+
+
+async def process_one(page, entry):
+    if entry.id == HANGING:
+        await asyncio.Event().wait()
+    if entry.id == FAILING:
+        raise RuntimeError("no download link")
+    processed.append(entry.id)
+
+
+FIND_FAILS = False
+HANGING = None
+"""
+
+
+class RunnerTest(ContextTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.patch(runner, "BrowserWrapper", FakeWrapper)
+
+    def test_import_procedure_while_tracing(self) -> None:
+        self.add_procedure("bank", PROCEDURE + "FAILING = None\n")
+        with Tracer().activate() as tracer:
+            module = import_procedure(self.ctx, "bank")
+        self.assertTrue(hasattr(module, "process_one"))
+        self.assertEqual([span.args["name"] for span in tracer.spans], ["bank"])
+
+    async def test_run_procedures(self) -> None:
+        proc = self.add_procedure("bank", PROCEDURE + "FAILING = None\n")
+        [result] = await runner.run_procedures(self.ctx, [proc], concurrency=2)
+        self.assertIsNone(result.error)
+        self.assertEqual((result.entries, result.processed, result.failed), (3, 3, 0))
+        self.assertTrue(result.trace and result.trace.exists())
+        self.assertEqual(
+            self.ctx.entry_index.outcomes("bank"), {"1": None, "2": None, "3": None}
+        )
+
+        [result] = await runner.run_procedures(self.ctx, [proc], concurrency=2)
+        self.assertEqual((result.entries, result.processed), (3, 0))
+
+    async def test_failed_entries_are_retried(self) -> None:
+        proc = self.add_procedure("bank", PROCEDURE + 'FAILING = "2"\n')
+        [result] = await runner.run_procedures(self.ctx, [proc], concurrency=1)
+        self.assertFalse(result.ok)
+        self.assertEqual(result.failed, 1)
+
+        [result] = await runner.run_procedures(self.ctx, [proc], concurrency=1)
+        self.assertEqual((result.processed, result.failed), (1, 1))
+
+    async def test_error_is_reported(self) -> None:
+        proc = self.add_procedure("bank", "syntax error")
+        [result] = await runner.run_procedures(self.ctx, [proc], concurrency=1)
+        self.assertTrue(result.error and result.error.startswith("SyntaxError"))
+
+    async def test_isolated_fingerprint_error_is_reported(self) -> None:
+        proc = self.add_procedure("bank", PROCEDURE + "FAILING = None\n")
+        proc.fingerprint = Fingerprint(selector="#statements")
+        self.ctx.isolated_execution = True
+        error = RuntimeError("net::ERR_CONNECTION_RESET")
+        with mock.patch.object(FakeWrapper, "goto", side_effect=error):
+            [result] = await runner.run_procedures(self.ctx, [proc], concurrency=1)
+        self.assertEqual(result.error, "RuntimeError: net::ERR_CONNECTION_RESET")
+
+    async def test_isolated_fingerprint_is_rate_limited(self) -> None:
+        proc = self.add_procedure("bank", PROCEDURE + "FAILING = None\n")
+        proc.fingerprint = Fingerprint(selector="#statements")
+        self.ctx.isolated_execution = True
+        limiter = RateLimiter(2.0)
+        error = RuntimeError("net::ERR_CONNECTION_RESET")
+        with mock.patch.object(FakeWrapper, "init", wraps=FakeWrapper.init) as init:
+            with mock.patch.object(FakeWrapper, "goto", side_effect=error):
+                await runner.run_procedure(self.ctx, proc, rate_limiter=limiter)
+        self.assertIs(init.call_args.kwargs["rate_limiter"], limiter)
+
+    async def test_landing_page_is_timed_out(self) -> None:
+        proc = self.add_procedure("bank", PROCEDURE + "FAILING = None\n")
+
+        async def _hang(_url: str) -> None:
+            await asyncio.Event().wait()
+
+        with mock.patch.object(FakeWrapper, "goto", side_effect=_hang):
+            [result] = await runner.run_procedures(
+                self.ctx, [proc], concurrency=1, timeout=0.05
+            )
+        self.assertEqual(result.error, "Timed out after 0.05s")
+
+    async def test_entries_are_recorded_when_find_fails(self) -> None:
+        proc = self.add_procedure("bank", PROCEDURE + "FAILING = None\nFIND_FAILS = True\n")
+        [result] = await runner.run_procedures(self.ctx, [proc], concurrency=1)
+        self.assertEqual(result.error, "find() failed: RuntimeError: next page not found")
+        self.assertEqual(result.processed, 3)
+        self.assertEqual(
+            self.ctx.entry_index.outcomes("bank"), {"1": None, "2": None, "3": None}
+        )
+
+    async def test_entries_are_recorded_when_timed_out(self) -> None:
+        proc = self.add_procedure("bank", PROCEDURE + 'FAILING = "2"\nHANGING = "3"\n')
+        [result] = await runner.run_procedures(self.ctx, [proc], concurrency=1, timeout=0.2)
+        self.assertEqual(result.error, "Timed out after 0.2s")
+        self.assertEqual(
+            self.ctx.entry_index.outcomes("bank"),
+            {"1": None, "2": "RuntimeError: no download link"},
+        )
@@ -0,0 +1,29 @@
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from src.snapshot_store import CACHE_MAX_AGE, SnapshotStore
+from src.store import MetadataStore
+
+
+class SnapshotStoreTest(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        home = Path(tmp.name)
+        self.snapshots = SnapshotStore(home / "snapshots", MetadataStore(home / "db"), None)
+        self.snapshots._cache_dir = home / "cache"
+
+    def test_stale_copies_are_deleted(self) -> None:
+        old = self.snapshots.open(self.snapshots.put(b"<html>January</html>"), ".html")
+        used = self.snapshots.open(self.snapshots.put(b"<html>February</html>"), ".html")
+        long_ago = time.time() - CACHE_MAX_AGE - 60
+        for path in (old, used):
+            os.utime(path, (long_ago, long_ago))
+        self.assertEqual(self.snapshots.open(used.stem, ".html"), used)
+
+        new = self.snapshots.open(self.snapshots.put(b"<html>March</html>"), ".html")
+        self.assertEqual(sorted(self.snapshots._cache_dir.iterdir()), sorted([used, new]))
+        self.assertEqual(new.read_bytes(), b"<html>March</html>")
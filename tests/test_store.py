@@ -0,0 +1,45 @@
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from src.env import Config, ProcedureInfoConfigOnly, Snapshot
+from src.snapshot_store import SCHEME
+from src.store import MetadataStore
+
+OLD = "a" * 64
+NEW = "b" * 64
+
+
+class MetadataStoreTest(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name) / "store.db"
+        self.store = MetadataStore(self.path)
+        now = datetime.now()
+        self.snapshots = [
+            Snapshot(uri=f"{SCHEME}{OLD}", time=now - timedelta(days=1)),
+            Snapshot(uri=f"{SCHEME}{NEW}", time=now),
+            # Mentions the old digest without using its blob
+            Snapshot(uri=f"https://bank.test/?ref={OLD}", time=now),
+        ]
+        procedures = {"bank": ProcedureInfoConfigOnly(snapshots=self.snapshots)}
+        self.store.save_config(Config(procedures=procedures))
+        self.store.add_blob(OLD, 100)
+        self.store.add_blob(NEW, 100)
+
+    def snapshot_uris(self) -> list[str]:
+        return [snap.uri for snap in self.store.load().procedures["bank"].snapshots]
+
+    def test_evict_blobs(self) -> None:
+        self.assertEqual(self.store.evict_blobs(150, keep={NEW}), {OLD})
+        self.assertEqual(self.snapshot_uris(), [self.snapshots[1].uri, self.snapshots[2].uri])
+
+    def test_blobs_of_existing_snapshots_are_linked(self) -> None:
+        with sqlite3.connect(self.path) as db:
+            db.execute("DROP TABLE snapshot_blobs")
+        self.store = MetadataStore(self.path)
+        self.assertEqual(self.store.evict_blobs(0, keep=set()), {OLD, NEW})
+        self.assertEqual(self.snapshot_uris(), [self.snapshots[2].uri])
@@ -0,0 +1,51 @@
+import asyncio
+import unittest
+from typing import Any
+from unittest import mock
+
+from src.tap import ResponseTap
+
+
+def fake_response(url: str, body: bytes) -> Any:
+    return mock.Mock(url=url, status=200, headers={}, body=mock.AsyncMock(return_value=body))
+
+
+class ResponseTapTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.context = mock.Mock()
+        self.tap = ResponseTap(r"/api/", max_buffered=2, max_buffered_bytes=10)
+        self.tap.attach(self.context)
+        [(_, self.on_response)] = [call.args for call in self.context.on.call_args_list]
+
+    async def respond(self, url: str, body: bytes = b"{}") -> None:
+        self.on_response(fake_response(url, body))
+        await self.tap.settle()
+
+    async def test_read_responses_are_released(self) -> None:
+        read = list[bytes]()
+
+        async def _read() -> None:
+            async for response in self.tap:
+                read.append(response.body)
+
+        reader = asyncio.create_task(_read())
+        for i in range(5):
+            await self.respond(f"https://bank.test/api/statements?page={i}", b"[%d]" % i)
+            await asyncio.sleep(0)
+        self.tap.close()
+        await reader
+        self.assertEqual(read, [b"[0]", b"[1]", b"[2]", b"[3]", b"[4]"])
+        self.assertEqual((self.tap.dropped, len(self.tap.responses)), (0, 0))
+
+    async def test_unread_responses_are_bounded(self) -> None:
+        await self.respond("https://bank.test/api/accounts")
+        await self.respond("https://bank.test/static/app.js")
+        await self.respond("https://bank.test/api/statements")
+        await self.respond("https://bank.test/api/statements?page=2")
+        self.assertEqual(self.tap.dropped, 1)
+        self.assertEqual((await self.tap.next()).url, "https://bank.test/api/accounts")
+
+        await self.respond("https://bank.test/api/documents", b"[" + b"0," * 4 + b"0]")
+        self.assertEqual(self.tap.dropped, 2)
+        await self.respond("https://bank.test/api/documents", b"[0]")
+        self.assertEqual(len(self.tap.responses), 2)
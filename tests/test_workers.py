@@ -0,0 +1,126 @@
+import asyncio
+import queue
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator
+from unittest import mock
+
+from src import workers
+from src.execution import EntryResult
+from src.workers import ProcedureWorkerPool, WorkerError, WorkerKilled, WorkerResult
+
+from .helpers import ContextTestCase
+
+
+class PrintingQueue(queue.Queue[tuple[str, Any]]):
+    """Events of a procedure that prints in a loop and never returns"""
+
+    def get(self, block: bool = True, timeout: float | None = None) -> tuple[str, Any]:
+        time.sleep(0.005)
+        return ("output", "still looking for statements\n")
+
+
+class FakeWorker:
+    """A `_Worker` that answers each job with the next of `replies`, without a process"""
+
+    replies = list[tuple[str, Any] | list[tuple[str, Any]] | None]()
+    "Events sent in reply to each job: one, several, or none at all"
+    printing = False
+    "Whether jobs print forever instead of replying"
+    rss: float | None = None
+
+    def __init__(self) -> None:
+        self.events = PrintingQueue() if self.printing else queue.Queue[tuple[str, Any]]()
+        self.jobs = mock.Mock(put=self._reply)
+        self.process = mock.Mock(exitcode=None)
+        self.process.is_alive.return_value = True
+
+    def _reply(self, _job: Any) -> None:
+        reply = self.replies.pop(0)
+        for event in reply if isinstance(reply, list) else [reply] if reply else []:
+            self.events.put(event)
+
+    def rss_mb(self) -> float | None:
+        return self.rss
+
+    def kill(self) -> None:
+        pass
+
+
+class FakeBrowserPool:
+    @asynccontextmanager
+    async def shared_endpoint(self, *, headless: bool) -> AsyncIterator[str]:
+        yield "ws://127.0.0.1:9222/fake"
+
+
+class WorkerPoolTest(ContextTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.patch(workers, "_Worker", FakeWorker)
+        self.patch(workers, "POLL_INTERVAL", 0.01)
+        self.ctx.browser_pool = FakeBrowserPool()  # type: ignore[assignment]
+        self.pool = ProcedureWorkerPool(self.ctx, size=1, timeout=0.5, memory_limit_mb=None)
+        self.proc = self.add_procedure("bank", "")
+
+    def _reply(self, *replies: tuple[str, Any] | list[tuple[str, Any]] | None) -> None:
+        self.patch(FakeWorker, "replies", list(replies))
+
+    async def test_worker_is_reused(self) -> None:
+        self._reply(("result", WorkerResult()), ("result", WorkerResult()))
+        await self.pool.find(self.proc)
+        [worker] = self.pool._idle
+        await self.pool.find(self.proc)
+        self.assertEqual(self.pool._idle, [worker])
+
+    async def test_worker_is_reused_after_procedure_error(self) -> None:
+        self._reply(("error", "Traceback: ValueError"))
+        with mock.patch.object(FakeWorker, "kill", autospec=True) as kill:
+            with self.assertRaises(WorkerError):
+                await self.pool.find(self.proc)
+        kill.assert_not_called()
+        self.assertEqual(len(self.pool._idle), 1)
+
+    async def test_results_are_passed_on_as_entries_are_processed(self) -> None:
+        first = EntryResult("1", 0.1)
+        self._reply([("entry_result", first), ("error", "Traceback: BrowserCrashed")])
+        results = list[EntryResult]()
+        with self.assertRaises(WorkerError):
+            await self.pool.process(self.proc, [], on_result=results.append)
+        self.assertEqual(results, [first])
+
+    async def test_worker_is_killed_after_timeout(self) -> None:
+        self._reply(None)
+        with mock.patch.object(FakeWorker, "kill", autospec=True) as kill:
+            with self.assertRaises(WorkerKilled):
+                await self.pool.find(self.proc)
+        kill.assert_called_once()
+        self.assertEqual(self.pool._idle, [])
+
+    async def test_printing_worker_is_killed_after_timeout(self) -> None:
+        self._reply(None)
+        self.patch(FakeWorker, "printing", True)
+        with mock.patch.object(FakeWorker, "kill", autospec=True) as kill:
+            with self.assertRaisesRegex(WorkerKilled, "Timed out"):
+                await self.pool.find(self.proc)
+        kill.assert_called_once()
+
+    async def test_printing_worker_is_killed_over_memory_limit(self) -> None:
+        self._reply(None)
+        self.patch(FakeWorker, "printing", True)
+        self.patch(FakeWorker, "rss", 2048.0)
+        self.pool.memory_limit_mb = 1024
+        with mock.patch.object(FakeWorker, "kill", autospec=True) as kill:
+            with self.assertRaisesRegex(WorkerKilled, "memory limit"):
+                await self.pool.find(self.proc)
+        kill.assert_called_once()
+
+    async def test_worker_is_killed_when_cancelled(self) -> None:
+        self._reply(None)
+        with mock.patch.object(FakeWorker, "kill", autospec=True) as kill:
+            task = asyncio.create_task(self.pool.find(self.proc))
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+        kill.assert_called_once()
+        self.assertEqual(self.pool._idle, [])